@@ -1,7 +1,14 @@
 """
 This part of the workflow summarizes sequence counts from existing metadata for a
 data provenance, variant classification system, and geo-resolution.
+
+The sequence counts for all variant classification systems and geo-resolutions
+of a data provenance are summarized in a single pass through its metadata.
 """
+import json
+import shlex
+
+SEQUENCE_COUNTS_EXTENSIONS = ["tsv", "parquet"] if config.get("parquet_counts") else ["tsv"]
 
 rule subset_metadata:
     output:
@@ -20,27 +27,54 @@ rule subset_metadata:
         """
 
 
+def _get_output_specs(w):
+    """
+    Return the `--output-spec` options for summarizing the clade sequence counts
+    of all variant classifications and geo resolutions of the
+    wildcards.data_provenance in a single pass through its metadata.
+    """
+    output_specs = []
+    for variant_classification in config["variant_classifications"]:
+        for geo_resolution in config["geo_resolutions"]:
+            output_spec = {
+                "output": [
+                    f"results/{w.data_provenance}/{variant_classification}/{geo_resolution}.{extension}"
+                    for extension in SEQUENCE_COUNTS_EXTENSIONS
+                ],
+                **config[w.data_provenance][variant_classification][geo_resolution]["seq_count_options"],
+            }
+            output_specs.append(f"--output-spec {shlex.quote(json.dumps(output_spec))}")
+
+    return " ".join(output_specs)
+
+
 rule summarize_clade_sequence_counts:
     input:
         subset_metadata = "data/{data_provenance}/subset_metadata.tsv.zst"
     output:
-        clade_seq_counts = "results/{data_provenance}/{variant_classification}/{geo_resolution}.tsv"
+        clade_seq_counts = expand(
+            "results/{{data_provenance}}/{variant_classification}/{geo_resolution}.{extension}",
+            variant_classification=config["variant_classifications"],
+            geo_resolution=config["geo_resolutions"],
+            extension=SEQUENCE_COUNTS_EXTENSIONS
+        )
     params:
-        seq_count_options = lambda w: config[w.data_provenance][w.variant_classification][w.geo_resolution]["seq_count_options"]
+        output_specs = _get_output_specs
+    threads: config.get("summarize_jobs", 2)
     benchmark:
-        "benchmarks/{data_provenance}/{variant_classification}/{geo_resolution}/summarize_clade_sequence_counts.txt"
+        "benchmarks/{data_provenance}/summarize_clade_sequence_counts.txt"
     shell:
         """
         ./bin/summarize-clade-sequence-counts \
             --metadata {input.subset_metadata} \
-            --output {output.clade_seq_counts} \
-            {params.seq_count_options}
+            --jobs {threads} \
+            {params.output_specs}
         """
 
 
-def _get_s3_url(w, input_file):
+def _get_s3_url(w, input_file, compression=".gz"):
     s3_dst = config["s3_dst"].rstrip("/")
-    s3_filepath = input_file.lstrip("results/") + ".gz"
+    s3_filepath = input_file.lstrip("results/") + compression
 
     return f"{s3_dst}/{s3_filepath}"
 
@@ -58,3 +92,19 @@ rule upload_sequence_count:
         """
         ./vendored/scripts/upload-to-s3 {input.clade_seq_counts} {params.s3_url:q} {params.cloudfront_domain:q}
         """
+
+
+rule upload_sequence_count_parquet:
+    input:
+        clade_seq_counts = "results/{data_provenance}/{variant_classification}/{geo_resolution}.parquet"
+    output: touch("results/{data_provenance}/{variant_classification}/{geo_resolution}_parquet_upload.done")
+    params:
+        # Parquet files are already compressed
+        s3_url = lambda w, input: _get_s3_url(w, input[0], compression=""),
+        cloudfront_domain = config["cloudfront_domain"]
+    benchmark:
+        "benchmarks/{data_provenance}/{variant_classification}/{geo_resolution}/upload_sequence_counts_parquet.txt"
+    shell:
+        """
+        ./vendored/scripts/upload-to-s3 {input.clade_seq_counts} {params.s3_url:q} {params.cloudfront_domain:q}
+        """
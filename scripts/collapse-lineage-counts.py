@@ -64,73 +64,142 @@
 # substantially to use pango_aliasor instead to get parent lineages.
 
 import argparse
+import numpy as np
 import pandas as pd
-from pango_aliasor.aliasor import Aliasor
-
-def get_low_count_lineages(seq_counts: pd.DataFrame, collapse_threshold: int) -> set:
-    total_counts = seq_counts.groupby("variant")["sequences"].sum()
-    low_count_lineages = set(total_counts[total_counts < collapse_threshold].index.to_list())
-    low_count_lineages.discard("other")
-    return low_count_lineages
-
-def lineage_depth(lineage: str, aliasor: Aliasor) -> int:
-    return len(aliasor.uncompress(lineage).split("."))
-
-def collapse_lineages(seq_counts, collapse_threshold, aliasor: Aliasor):
-    print("Starting variants:", len(seq_counts.groupby("variant")))
-    print(seq_counts.variant.unique())
-
-    low_count_lineages = get_low_count_lineages(seq_counts, collapse_threshold)
-
-    # Find max depth of lineage tree
-    max_lineage_depth = max(map(lambda x: lineage_depth(x, aliasor), low_count_lineages))
-
-    # Collapse lineages from highest depth to lowest depth
+from collections import defaultdict, namedtuple
+from count_tables import read_counts, write_counts
+from pango_aliases import PangoAliases
+
+# Sparse (location, date) × lineage matrix of sequence counts in coordinate
+# form, where each non-empty cell has a row code for its (location, date), a
+# column code for its lineage and its sequences.
+CountMatrix = namedtuple("CountMatrix", ["locations", "dates", "lineages", "rows", "columns", "sequences"])
+
+def pivot_lineage_counts(seq_counts: pd.DataFrame) -> CountMatrix:
+    seq_counts = seq_counts.dropna(subset=["location", "date", "variant"])
+    location_codes, locations = pd.factorize(seq_counts["location"])
+    date_codes, dates = pd.factorize(seq_counts["date"])
+    lineage_codes, lineages = pd.factorize(seq_counts["variant"])
+    return merge_cells(CountMatrix(
+        locations=locations,
+        dates=dates,
+        lineages=np.asarray(lineages, dtype=object),
+        rows=location_codes * len(dates) + date_codes,
+        columns=lineage_codes,
+        sequences=seq_counts["sequences"].to_numpy(),
+    ))
+
+def merge_cells(matrix: CountMatrix) -> CountMatrix:
+    # Sum the sequences of cells with the same row and column
+    cells, cell_codes = np.unique(matrix.rows * len(matrix.lineages) + matrix.columns, return_inverse=True)
+    return matrix._replace(
+        rows=cells // len(matrix.lineages),
+        columns=cells % len(matrix.lineages),
+        sequences=np.bincount(cell_codes.ravel(), weights=matrix.sequences, minlength=len(cells)).astype("int64"),
+    )
+
+def get_lineage_totals(matrix: CountMatrix) -> dict:
+    totals = np.bincount(matrix.columns, weights=matrix.sequences, minlength=len(matrix.lineages)).astype("int64")
+    return dict(zip(matrix.lineages, totals))
+
+def get_collapsed_lineages(lineage_totals: dict, collapse_threshold: int, aliasor: PangoAliases) -> dict:
+    # Build the lineage tree once from the total counts of each lineage.
+    # Only lineages below the threshold are added to the tree, since merging
+    # child lineages only ever increases the total counts of a lineage.
+    lineage_totals = dict(lineage_totals)
+    lineages_by_depth = defaultdict(set)
+    for lineage, total in lineage_totals.items():
+        if lineage != "other" and total < collapse_threshold:
+            lineages_by_depth[aliasor.depth(lineage)].add(lineage)
+
+    # Collapse lineages from highest depth to lowest depth, rolling up the
+    # totals of collapsed lineages into their parents on the tree
+    collapsed_into = {}
+    max_lineage_depth = max(lineages_by_depth, default=0)
     for depth in range(max_lineage_depth, 0, -1):
-        low_count_lineages_at_depth = set()
-        for lineage in low_count_lineages:
-            if lineage_depth(lineage, aliasor) == depth:
-                low_count_lineages_at_depth.add(lineage)
-                parent = aliasor.parent(lineage)
-                if parent == "":
-                    parent = "other"
-                seq_counts.loc[seq_counts["variant"] == lineage, "variant"] = parent
+        low_count_lineages_at_depth = {
+            lineage
+            for lineage in lineages_by_depth[depth]
+            if lineage_totals[lineage] < collapse_threshold
+        }
+        for lineage in low_count_lineages_at_depth:
+            parent = aliasor.parent(lineage)
+            if parent == "":
+                parent = "other"
+
+            if parent not in lineage_totals and parent != "other":
+                lineages_by_depth[aliasor.depth(parent)].add(parent)
+
+            collapsed_into[lineage] = parent
+            lineage_totals[parent] = lineage_totals.get(parent, 0) + lineage_totals.pop(lineage)
+
         print("At depth", depth, "there are", len(low_count_lineages_at_depth), "low count lineages")
         print(low_count_lineages_at_depth)
 
-        low_count_lineages = get_low_count_lineages(seq_counts, collapse_threshold)
-
-    print("Ending variants:", len(seq_counts.groupby("variant")))
-    print(seq_counts.variant.unique())
-
-    return seq_counts
-
-def aggregate_counts(seq_counts):
-    return seq_counts.groupby(["location", "variant", "date"], as_index=False)["sequences"].sum()
+    def collapsed_lineage(lineage):
+        while lineage in collapsed_into:
+            lineage = collapsed_into[lineage]
+        return lineage
+
+    return {lineage: collapsed_lineage(lineage) for lineage in lineage_totals.keys() | collapsed_into.keys()}
+
+def merge_lineages(matrix: CountMatrix, collapsed_lineages: dict) -> CountMatrix:
+    # Merging lineages is a single recode of the matrix columns to the
+    # columns of the lineages they were collapsed into
+    column_codes, lineages = pd.factorize(np.array([collapsed_lineages[lineage] for lineage in matrix.lineages], dtype=object))
+    return merge_cells(matrix._replace(
+        lineages=np.asarray(lineages, dtype=object),
+        columns=column_codes[matrix.columns],
+    ))
+
+def melt_lineage_counts(matrix: CountMatrix) -> pd.DataFrame:
+    seq_counts = pd.DataFrame({
+        "location": matrix.locations.take(matrix.rows // len(matrix.dates)),
+        "variant": matrix.lineages[matrix.columns],
+        "date": matrix.dates.take(matrix.rows % len(matrix.dates)),
+        "sequences": matrix.sequences,
+    })
+    # Match the order of grouping the counts by location, variant and date
+    return seq_counts.sort_values(["location", "variant", "date"], ignore_index=True)
+
+def collapse_lineages(seq_counts, collapse_threshold, aliasor: PangoAliases):
+    matrix = pivot_lineage_counts(seq_counts)
+    print("Starting variants:", len(matrix.lineages))
+    print(matrix.lineages)
+
+    collapsed_lineages = get_collapsed_lineages(get_lineage_totals(matrix), collapse_threshold, aliasor)
+    matrix = merge_lineages(matrix, collapsed_lineages)
+
+    print("Ending variants:", len(matrix.lineages))
+    print(matrix.lineages)
+
+    return melt_lineage_counts(matrix)
 
 def sort_output(seq_counts):
     return seq_counts.sort_values(["variant", "date"])
 
 def save_seq_counts(seq_counts, output_file):
-    seq_counts.to_csv(output_file, sep="\t", index=False)
+    write_counts(seq_counts, output_file)
 
 def main():
     parser = argparse.ArgumentParser(description = "Given input sequence counts and \
         Pango aliasing file, collapse Pango lineages into their parental lineages \
         based on supplied threshold and output a new sequence counts file")
-    parser.add_argument("--seq-counts", type=str, required=True, help="input TSV of sequence counts")
+    parser.add_argument("--seq-counts", type=str, required=True, help="input TSV or Parquet file of sequence counts")
     parser.add_argument("--collapse-threshold", type=int, default=1000, help="threshold count to collapse lineage into parental lineage")
-    parser.add_argument("--output-seq-counts", type=str, required=True, help="output TSV of collapsed sequence counts")
+    parser.add_argument("--pango-alias", type=str, help="local Pango alias key JSON. If not provided, the latest alias key is downloaded from GitHub")
+    parser.add_argument("--pango-alias-cache", type=str, help="JSON file to load and save resolved Pango lineages between runs")
+    parser.add_argument("--output-seq-counts", type=str, required=True, help="output TSV of collapsed sequence counts, written as Parquet if the path ends with '.parquet'")
     args = parser.parse_args()
 
-    seq_counts = pd.read_csv(args.seq_counts, sep="\t")
+    seq_counts = read_counts(args.seq_counts)
 
-    # Automatically downloads aliasing file from github, needs internet connection
+    # Without a local alias key, the alias key is downloaded from github, which needs internet connection
     # File is sourced from https://github.com/cov-lineages/pango-designation/blob/master/pango_designation/alias_key.json
-    aliasor: Aliasor = Aliasor()
+    aliasor = PangoAliases(args.pango_alias, cache=args.pango_alias_cache)
 
     seq_counts = collapse_lineages(seq_counts, args.collapse_threshold, aliasor)
-    seq_counts = aggregate_counts(seq_counts)
+    aliasor.save()
     seq_counts = sort_output(seq_counts)
 
     save_seq_counts(seq_counts, args.output_seq_counts)
@@ -0,0 +1,275 @@
+"""
+Read and write count tables (e.g. sequence counts and case counts) as either
+TSV files or typed columnar Parquet files, based on the file extension.
+
+In Parquet files, location and variant/clade columns are dictionary-encoded
+strings, the date column is a date32 column and count columns are int32
+columns, so readers do not need to re-parse text or infer dates.
+
+Parsed TSV files can be cached on disk as Parquet files by setting the
+COUNT_TABLES_CACHE_DIR environment variable. Cached tables are keyed by the
+hash of the file contents and the options used to parse them, so rerunning a
+step on the same inputs with different options skips parsing. The least recently used tables are
+evicted once the cache is larger than COUNT_TABLES_CACHE_MAX_SIZE_MB.
+"""
+import hashlib
+import json
+import os
+import pandas as pd
+import shutil
+import sys
+import tempfile
+
+
+PARQUET_EXTENSION = ".parquet"
+
+STRING_COLUMNS = ("location", "clade", "variant")
+DATE_COLUMNS = ("date",)
+COUNT_COLUMNS = ("sequences", "cases")
+
+# Number of TSV rows to parse at a time when reading a subset of a count table
+SUBSET_CHUNK_SIZE = 100000
+
+CACHE_DIR_ENVVAR = "COUNT_TABLES_CACHE_DIR"
+CACHE_MAX_SIZE_ENVVAR = "COUNT_TABLES_CACHE_MAX_SIZE_MB"
+DEFAULT_CACHE_MAX_SIZE_MB = 2048
+CACHE_EXTENSION = PARQUET_EXTENSION
+
+
+def is_parquet(path):
+    """
+    Return whether the count table at *path* is a Parquet file.
+    """
+    return str(path).endswith(PARQUET_EXTENSION)
+
+
+def read_counts(path, parse_dates=None, dtype=None):
+    """
+    Read the count table at *path* into a DataFrame.
+
+    TSV files are read with `pd.read_csv` using the provided *parse_dates* and
+    *dtype*. Parquet files are read directly from their typed columns, where
+    date columns are datetime64 columns, count columns are int64 columns and
+    dictionary-encoded columns are converted to plain strings unless a
+    different *dtype* is requested.
+    """
+    if not is_parquet(path):
+        return _cached(
+            path,
+            {"reader": "read_counts", "parse_dates": parse_dates, "dtype": dtype},
+            lambda: pd.read_csv(path, sep="\t", parse_dates=parse_dates, dtype=dtype),
+        )
+
+    return _convert_parquet_columns(pd.read_parquet(path), dtype)
+
+
+def read_counts_subset(path, locations, min_date=None, max_date=None, dtype=None):
+    """
+    Read the rows of the count table at *path* for the *locations* with
+    dates from *min_date* to *max_date* (inclusive) into a DataFrame. If
+    *min_date* or *max_date* are None, the dates are not limited on that side.
+
+    Rows are filtered while reading, so only the subset is held in memory.
+    TSV files are parsed in chunks, where dates are only parsed for rows of
+    the *locations*. Parquet files are read with the filters pushed down to
+    the Parquet reader.
+    """
+    locations = list(locations)
+
+    if is_parquet(path):
+        filters = [("location", "in", locations)]
+        if min_date is not None:
+            filters.append(("date", ">=", pd.Timestamp(min_date).date()))
+        if max_date is not None:
+            filters.append(("date", "<=", pd.Timestamp(max_date).date()))
+
+        return _convert_parquet_columns(pd.read_parquet(path, filters=filters), dtype)
+
+    def read_subset():
+        subsets = []
+        for chunk in pd.read_csv(path, sep="\t", dtype=dtype, chunksize=SUBSET_CHUNK_SIZE):
+            chunk = chunk.loc[chunk["location"].isin(locations)]
+            chunk = chunk.assign(date=pd.to_datetime(chunk["date"]))
+            if min_date is not None:
+                chunk = chunk.loc[chunk["date"] >= min_date]
+            if max_date is not None:
+                chunk = chunk.loc[chunk["date"] <= max_date]
+            subsets.append(chunk)
+
+        # Tables with a header but no rows have no chunks, so return their
+        # empty columns with the same types as a subset with rows
+        if not subsets:
+            empty = pd.read_csv(path, sep="\t", dtype=dtype, nrows=0)
+            return empty.assign(date=pd.to_datetime(empty["date"]))
+
+        return pd.concat(subsets, ignore_index=True)
+
+    return _cached(
+        path,
+        {
+            "reader": "read_counts_subset",
+            "parse_dates": list(DATE_COLUMNS),
+            "locations": sorted(locations),
+            "min_date": min_date,
+            "max_date": max_date,
+            "dtype": dtype,
+        },
+        read_subset,
+    )
+
+
+def _convert_parquet_columns(counts, dtype=None):
+    """
+    Convert the typed columns of *counts* read from a Parquet file to the
+    same types as `pd.read_csv` would return.
+    """
+    dtype = dtype or {}
+    for column in counts.columns:
+        if column in DATE_COLUMNS:
+            counts[column] = pd.to_datetime(counts[column])
+        elif column in dtype:
+            counts[column] = counts[column].astype(dtype[column])
+        elif isinstance(counts[column].dtype, pd.CategoricalDtype):
+            counts[column] = counts[column].astype(object)
+        elif column in COUNT_COLUMNS:
+            counts[column] = counts[column].astype("int64")
+
+    return counts
+
+
+def write_counts(counts, path):
+    """
+    Write the *counts* DataFrame to *path* as a TSV file or a Parquet file.
+    """
+    if not is_parquet(path):
+        counts.to_csv(path, sep="\t", index=False)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = {}
+    for column in counts.columns:
+        values = counts[column]
+        if column in STRING_COLUMNS:
+            columns[column] = pa.array(values.astype(object), type=pa.string(), from_pandas=True).dictionary_encode()
+        elif column in DATE_COLUMNS:
+            columns[column] = pa.array(pd.to_datetime(values).dt.date, type=pa.date32())
+        elif column in COUNT_COLUMNS:
+            columns[column] = pa.array(values, type=pa.int32())
+        else:
+            columns[column] = pa.array(values, from_pandas=True)
+
+    pq.write_table(pa.table(columns), path)
+
+
+def _cached(path, spec, read):
+    """
+    Return the count table at *path* parsed with *read*, using the on-disk
+    cache if it is enabled with the COUNT_TABLES_CACHE_DIR environment
+    variable. The *spec* describes how the table is parsed and is included
+    in the cache key along with the hash of the file contents.
+
+    Tables are cached as Parquet files with `write_counts`. Cached tables are
+    converted back to the *spec*'s dtype with `read_counts`, and their date
+    columns are converted back to strings unless the *spec* parses them.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENVVAR)
+    if not cache_dir:
+        return read()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, _cache_key(path, spec) + CACHE_EXTENSION)
+
+    if os.path.exists(cache_path):
+        try:
+            counts = read_counts(cache_path, dtype=spec["dtype"])
+            for column in counts.columns:
+                if column in DATE_COLUMNS and column not in (spec["parse_dates"] or []):
+                    counts[column] = counts[column].dt.strftime("%Y-%m-%d").astype(object)
+        except Exception as error:
+            print(f"WARNING: Unable to read cached count table {cache_path!r}, re-parsing {str(path)!r}: {error}", file=sys.stderr)
+        else:
+            # Mark the cached table as recently used for eviction
+            os.utime(cache_path)
+            return counts
+
+    counts = read()
+
+    # Write to a temporary file first, so concurrent readers never see a
+    # partially written table
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-", suffix=CACHE_EXTENSION)
+    os.close(fd)
+    try:
+        write_counts(counts, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as error:
+        print(f"WARNING: Unable to cache count table {str(path)!r}: {error}", file=sys.stderr)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    evict_cache(cache_dir, float(os.environ.get(CACHE_MAX_SIZE_ENVVAR, DEFAULT_CACHE_MAX_SIZE_MB)) * 1024 * 1024)
+
+    return counts
+
+
+def _cache_key(path, spec):
+    """
+    Return the cache key for the count table at *path* parsed with *spec*,
+    which is a hash of the file contents, the *spec* and the pandas version.
+    """
+    key = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            key.update(block)
+
+    key.update(json.dumps([spec, pd.__version__], sort_keys=True, default=str).encode())
+    return key.hexdigest()
+
+
+def _entry_size(entry):
+    """
+    Return the size of the cache *entry* in bytes, which is the total size of
+    its files if it is a directory.
+    """
+    if not entry.is_dir():
+        return entry.stat().st_size
+
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(entry.path)
+        for filename in filenames
+    )
+
+
+def evict_cache(cache_dir, max_size, extension=CACHE_EXTENSION):
+    """
+    Remove the least recently used files or directories with the *extension*
+    from the cache in *cache_dir* until the total size of the cache is at most
+    *max_size* bytes. Hidden entries are temporary entries that are still
+    being written, so they are never removed.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(extension) and not entry.name.startswith("."):
+            try:
+                entries.append((entry.stat().st_mtime, _entry_size(entry), entry.path, entry.is_dir()))
+            except FileNotFoundError:
+                # Removed by another process while scanning
+                continue
+
+    total_size = sum(size for _, size, _, _ in entries)
+    for _, size, entry_path, is_dir in sorted(entries):
+        if total_size <= max_size:
+            break
+
+        try:
+            if is_dir:
+                shutil.rmtree(entry_path)
+            else:
+                os.remove(entry_path)
+        except FileNotFoundError:
+            # Already removed by another process
+            pass
+        total_size -= size
@@ -0,0 +1,125 @@
+"""
+Cache the posteriors of model fits on disk between runs.
+
+The cache is enabled by setting the MODEL_FITS_CACHE_DIR environment variable.
+Posteriors are keyed by the hash of the sequence counts a model is fit to and
+the options of the fit (e.g. the model and inference configs, the pivot and the
+warm start the fit was started from), so rerunning a model on unchanged data
+loads the posterior of the previous fit instead of refitting it. The least
+recently used posteriors are evicted once the cache is larger than
+MODEL_FITS_CACHE_MAX_SIZE_MB.
+
+Posteriors are cached as posterior arrays (see posterior_arrays), which are
+loaded as plain arrays without unpickling, so loading a cached posterior cannot
+run code from the cache directory.
+"""
+import hashlib
+import json
+import os
+import sys
+
+import evofr as ef
+import pandas as pd
+
+from count_tables import evict_cache
+from posterior_arrays import POSTERIOR_ARRAYS_EXTENSION, load_posterior_arrays, save_posterior_arrays
+
+
+CACHE_DIR_ENVVAR = "MODEL_FITS_CACHE_DIR"
+CACHE_MAX_SIZE_ENVVAR = "MODEL_FITS_CACHE_MAX_SIZE_MB"
+DEFAULT_CACHE_MAX_SIZE_MB = 4096
+CACHE_EXTENSION = POSTERIOR_ARRAYS_EXTENSION
+
+
+def fit_cache_enabled():
+    """
+    Return whether the cache is enabled with the MODEL_FITS_CACHE_DIR
+    environment variable.
+    """
+    return bool(os.environ.get(CACHE_DIR_ENVVAR))
+
+
+def file_hash(path):
+    """
+    Return the hash of the contents of the file at *path*, or None if it does
+    not exist, to key fits by the files they are started from.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def fit_cache_key(raw_seq, spec):
+    """
+    Return the cache key of a fit to the sequence counts *raw_seq* with the
+    options *spec*, which is a hash of the sequence counts regardless of their
+    row order, the *spec* and the evofr version.
+    """
+    # Dates may be parsed or not, depending on how the counts were read
+    columns = sorted(raw_seq.columns)
+    raw_seq = raw_seq[columns].assign(date=pd.to_datetime(raw_seq["date"]).dt.strftime("%Y-%m-%d")).sort_values(columns)
+
+    key = hashlib.sha256()
+    key.update(pd.util.hash_pandas_object(raw_seq, index=False).to_numpy().tobytes())
+    key.update(json.dumps([columns, spec, ef.__version__], sort_keys=True, default=str).encode())
+    return key.hexdigest()
+
+
+def _cache_path(key):
+    """
+    Return the path of the cached posterior with *key*, or None if the cache
+    is not enabled with the MODEL_FITS_CACHE_DIR environment variable.
+    """
+    if not fit_cache_enabled():
+        return None
+
+    return os.path.join(os.environ[CACHE_DIR_ENVVAR], key + CACHE_EXTENSION)
+
+
+def load_cached_posterior(key, data, name):
+    """
+    Return the cached posterior with *key* for the *data* of the fit named
+    *name*, or None if the posterior is not cached.
+    """
+    cache_path = _cache_path(key)
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
+
+    try:
+        # Read the samples into memory, as the cached posterior may be
+        # evicted by another run while it is used
+        samples = load_posterior_arrays(cache_path, mmap_mode=None)
+    except Exception as error:
+        print(f"WARNING: Unable to read cached posterior {cache_path!r}, refitting {name!r}: {error}", file=sys.stderr)
+        return None
+
+    # Mark the cached posterior as recently used for eviction
+    os.utime(cache_path)
+    return ef.PosteriorHandler(samples=samples, data=data, name=name)
+
+
+def cache_posterior(key, posterior):
+    """
+    Save the *posterior* in the cache with *key* if the cache is enabled.
+    """
+    cache_path = _cache_path(key)
+    if cache_path is None:
+        return
+
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Posterior arrays are written to a hidden temporary directory first, so
+    # concurrent readers never see a partially written posterior
+    try:
+        save_posterior_arrays(posterior, cache_path)
+    except Exception as error:
+        print(f"WARNING: Unable to cache posterior {posterior.name!r}: {error}", file=sys.stderr)
+
+    evict_cache(
+        cache_dir,
+        float(os.environ.get(CACHE_MAX_SIZE_ENVVAR, DEFAULT_CACHE_MAX_SIZE_MB)) * 1024 * 1024,
+        extension=CACHE_EXTENSION,
+    )
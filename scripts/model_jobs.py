@@ -0,0 +1,83 @@
+"""
+Fit the models of independent locations in a pool of processes.
+
+Each worker process is started with its numerical libraries limited to its
+share of the available cores, so that the workers do not compete for cores
+with each other. Workers are started with the "spawn" method, as JAX is
+multithreaded and does not support forking.
+
+Each location is fit from its own random state, derived from a single seed and
+the name of the location, so the fit of a location is the same regardless of
+the other locations that are fit and of the order or parallelism of the fits.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from jax import random
+
+
+# Environment variables that limit the threads of the numerical libraries
+THREAD_ENVIRONMENT_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+# XLA flags that run each worker's JAX computations on a single thread
+SINGLE_THREAD_XLA_FLAGS = "--xla_cpu_multi_thread_eigen=false intra_op_parallelism_threads=1"
+
+
+def location_rng_key(rng_key, location):
+    """
+    Return the random state of the fit of *location*, derived from the seed
+    *rng_key* and the name of the location.
+    """
+    digest = hashlib.sha256(str(location).encode()).digest()
+    return random.fold_in(rng_key, int.from_bytes(digest[:4], "little"))
+
+
+def threads_per_job(jobs):
+    """
+    Return the number of threads for each of *jobs* processes to share the
+    available cores.
+    """
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+
+@contextmanager
+def worker_environment(threads):
+    """
+    Set the environment inherited by worker processes to limit each worker to
+    *threads* threads, restoring the original environment on exit.
+    """
+    environment = {variable: str(threads) for variable in THREAD_ENVIRONMENT_VARIABLES}
+    if threads == 1:
+        environment["XLA_FLAGS"] = " ".join(filter(None, [os.environ.get("XLA_FLAGS"), SINGLE_THREAD_XLA_FLAGS]))
+
+    original = {variable: os.environ.get(variable) for variable in environment}
+    os.environ.update(environment)
+    try:
+        yield
+    finally:
+        for variable, value in original.items():
+            if value is None:
+                del os.environ[variable]
+            else:
+                os.environ[variable] = value
+
+
+def fit_locations(fit_location, tasks, jobs=1):
+    """
+    Yield the result of `fit_location(*task)` for each of the *tasks* in order.
+    If *jobs* is greater than 1, the tasks are run in a pool of *jobs*
+    processes, but results are still yielded in the order of the *tasks*.
+    """
+    if jobs <= 1:
+        for task in tasks:
+            yield fit_location(*task)
+        return
+
+    with worker_environment(threads_per_job(jobs)), \
+         ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(fit_location, *task) for task in tasks]
+        for future in futures:
+            yield future.result()
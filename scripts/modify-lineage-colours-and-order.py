@@ -1,6 +1,8 @@
 import json
 import argparse
-from pango_aliasor.aliasor import Aliasor
+import re
+import shutil
+from pango_aliases import PangoAliases
 import matplotlib as mpl
 import numpy as np
 import colorsys
@@ -9,6 +11,12 @@ import colorsys
 # Color for clades that lack clade definition, but we don't want to group with 'other'
 DEFAULT_CLADE_COLOR = '#474747'
 
+# Number of characters read at a time when looking for the metadata of the results JSON
+JSON_CHUNK_SIZE = 1024 * 1024
+
+# Start of a results JSON whose first key is the metadata object
+RESULTS_METADATA_START = re.compile(r'\s*\{\s*"metadata"\s*:\s*')
+
 
 def order_lineages(lineages, aliasor):
     """
@@ -25,15 +33,34 @@ def order_lineages(lineages, aliasor):
     return sorted(lineages,key=_lineage_sortable)
 
 
-def lineage_to_clade(lineage, aliasor, fallback, clade_definitions):
-    lineage_full = aliasor.uncompress(lineage)
-    for clade_data in clade_definitions:
+def index_defining_lineages(clade_definitions, aliasor):
+    """
+    Index the clade definitions by their uncompressed defining lineage, so the
+    clade of a lineage can be found from the prefixes of its uncompressed name.
+    Each defining lineage is mapped to the position and name of its first
+    clade in the config order.
+    """
+    defining_lineages = {}
+    for position, clade_data in enumerate(clade_definitions):
         if clade_data['clade']=='other':
             continue
-        comparison_lineage = aliasor.uncompress(clade_data['defining_lineage'])
-        if lineage_full == comparison_lineage or lineage_full.startswith(comparison_lineage + "."):
-            return clade_data['clade']
-    return fallback
+        defining_lineage = aliasor.uncompress(clade_data['defining_lineage'])
+        defining_lineages.setdefault(defining_lineage, (position, clade_data['clade']))
+    return defining_lineages
+
+def lineage_to_clade(lineage, aliasor, fallback, defining_lineages):
+    """
+    Return the first clade in the config order whose defining lineage is the
+    *lineage* or one of its parents, using the *defining_lineages* index from
+    `index_defining_lineages`.
+    """
+    lineage_parts = aliasor.uncompress(lineage).split('.')
+    matches = [
+        defining_lineages[prefix]
+        for prefix in ('.'.join(lineage_parts[:i]) for i in range(1, len(lineage_parts) + 1))
+        if prefix in defining_lineages
+    ]
+    return min(matches)[1] if matches else fallback
 
 def clade_colors(variants, clade_definitions):
     colors = {c['clade']: c['color'] for c in clade_definitions}
@@ -80,7 +107,7 @@ def colour_range(anchor, n):
         return int(max(0, min(x, 255)))
     return [f"#{clamp(rgb[0]):02x}{clamp(rgb[1]):02x}{clamp(rgb[2]):02x}" for rgb in rgb_range]
 
-def colourise(lineages, aliasor, clade_definitions):
+def colourise(lineages, aliasor, clade_definitions, defining_lineages):
     """
     Produces an array of arrays associating observed lineages with a colour hex. Example output:
         [
@@ -88,53 +115,116 @@ def colourise(lineages, aliasor, clade_definitions):
             ...
         ]
     """
-    clades = {lineage: lineage_to_clade(lineage, aliasor, 'other', clade_definitions)
-              for lineage in lineages}
+    clade_lineages = {}
+    for lineage in lineages: # lineages of each clade will be ordered
+        clade = lineage_to_clade(lineage, aliasor, 'other', defining_lineages)
+        clade_lineages.setdefault(clade, []).append(lineage)
+
+    clade_colours = {}
+    for clade_data in clade_definitions:
+        clade_colours.setdefault(clade_data['clade'], clade_data['color'])
 
     colours = []
 
-    for clade in list(set(clades.values())):
-        matching_lineages = [l for l in lineages if clades[l]==clade] # will be ordered
+    for clade, matching_lineages in clade_lineages.items():
         print(f"{clade:<10}n={len(matching_lineages)} lineages")
-        color_hex = [x['color'] for x in clade_definitions if x['clade']==clade][0]
+        color_hex = clade_colours[clade]
         for pair in zip(matching_lineages, colour_range(color_hex, len(matching_lineages))):
             colours.append(pair)
     return colours
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--input", required=True, metavar="JSON")
-    parser.add_argument("--output", required=True, metavar="JSON")
-    parser.add_argument("--variant-classification", required=True, help="Data will be modified for 'nextstrain_clades' or 'pango_lineages'")
-    parser.add_argument("--config", required=True, metavar="JSON string", help="clade definitions")
-    parser.add_argument("--pango-alias", help="[optional] pango alias JSON", default=None)
-    args = parser.parse_args()
+def read_results_metadata(fh):
+    """
+    Read the results JSON from *fh* only up to the end of its metadata object.
 
-    with open(args.input, 'r') as fh:
-        data = json.load(fh)
-    clade_definitions = json.loads(args.config)
+    Returns the text before the metadata object, the parsed metadata, and the
+    text already read after the metadata object, leaving *fh* positioned to
+    read the rest of the results. Returns None if the metadata is not the first
+    key of the results, as the results then have to be parsed in full.
+    """
+    buffer = fh.read(JSON_CHUNK_SIZE)
+    start = RESULTS_METADATA_START.match(buffer)
+    if start is None:
+        return None
+
+    decoder = json.JSONDecoder()
+    while True:
+        try:
+            metadata, end = decoder.raw_decode(buffer, start.end())
+            break
+        except json.JSONDecodeError:
+            chunk = fh.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+
+    return buffer[:start.end()], metadata, buffer[end:]
 
+def modify_metadata(metadata, args, clade_definitions):
+    """
+    Modify the variant order, colours and display names in the *metadata* of
+    the results in place.
+    """
     if (args.variant_classification=='nextstrain_clades'):
-        data['metadata']['variantColors'] = clade_colors(data['metadata']['variants'], clade_definitions)
-        data['metadata']['variantDisplayNames'] = clade_display_names(data['metadata']['variants'], clade_definitions)
+        metadata['variantColors'] = clade_colors(metadata['variants'], clade_definitions)
+        metadata['variantDisplayNames'] = clade_display_names(metadata['variants'], clade_definitions)
 
     elif (args.variant_classification=='pango_lineages'):
-        aliasor = Aliasor(args.pango_alias)
+        aliasor = PangoAliases(args.pango_alias, cache=args.pango_alias_cache)
+        defining_lineages = index_defining_lineages(clade_definitions, aliasor)
 
         # Sort lineages, but keep the final element in place (the "pivot" variant)
-        data['metadata']['variants'] = order_lineages(data['metadata']['variants'][0:-1], aliasor) + [data['metadata']['variants'][-1]]
+        metadata['variants'] = order_lineages(metadata['variants'][0:-1], aliasor) + [metadata['variants'][-1]]
 
         print("---- Lineages to associated clades -----")
-        for lineage in data['metadata']['variants']:
-            print(f"{lineage:<20}{lineage_to_clade(lineage, aliasor, 'other', clade_definitions)}")
+        for lineage in metadata['variants']:
+            print(f"{lineage:<20}{lineage_to_clade(lineage, aliasor, 'other', defining_lineages)}")
         print()
 
         print("---- Generating colours for each observed lineage -----")
-        data['metadata']['variantColors'] = colourise(data['metadata']['variants'], aliasor, clade_definitions)
+        metadata['variantColors'] = colourise(metadata['variants'], aliasor, clade_definitions, defining_lineages)
+        aliasor.save()
 
     else:
         print(f"Variant classification of {args.variant_classification}: no post-processing of JSON")
 
-    with open(args.output, 'w') as fh:
-        json.dump(data, fh, indent=None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", required=True, metavar="JSON")
+    parser.add_argument("--output", required=True, metavar="JSON")
+    parser.add_argument("--variant-classification", required=True, help="Data will be modified for 'nextstrain_clades' or 'pango_lineages'")
+    parser.add_argument("--config", required=True, metavar="JSON string", help="clade definitions")
+    parser.add_argument("--pango-alias", help="[optional] pango alias JSON", default=None)
+    parser.add_argument("--pango-alias-cache", help="[optional] JSON file to load and save resolved pango lineages between runs", default=None)
+    parser.add_argument("--metadata-only", action="store_true",
+        help="Only parse and rewrite the metadata of the results JSON, copying the rest of the results through unchanged. " +
+             "Falls back to parsing the full results if the metadata is not the first key of the results.")
+    args = parser.parse_args()
+
+    clade_definitions = json.loads(args.config)
+
+    # newline='' keeps the copied results byte for byte identical to the input
+    with open(args.input, 'r', encoding='utf-8', newline='') as fh:
+        results_metadata = read_results_metadata(fh) if args.metadata_only else None
+
+        if results_metadata is not None:
+            before_metadata, metadata, after_metadata = results_metadata
+            modify_metadata(metadata, args, clade_definitions)
+
+            with open(args.output, 'w', encoding='utf-8', newline='') as output:
+                output.write(before_metadata)
+                json.dump(metadata, output, indent=None)
+                output.write(after_metadata)
+                shutil.copyfileobj(fh, output, JSON_CHUNK_SIZE)
+
+        else:
+            if args.metadata_only:
+                print("The metadata is not the first key of the results JSON: parsing the full results")
+            fh.seek(0)
+            data = json.load(fh)
+            modify_metadata(data['metadata'], args, clade_definitions)
+
+            with open(args.output, 'w') as output:
+                json.dump(data, output, indent=None)
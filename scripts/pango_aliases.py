@@ -0,0 +1,110 @@
+"""
+Resolve Pango lineage aliases for the lineage scripts.
+
+Aliases are resolved with pango_aliasor from a local copy of the Pango alias
+key, so the scripts do not need to download the alias key on every run. The
+uncompressed name, parent and depth of each lineage are memoized, and the
+resolved lineages can be saved to a JSON cache to reuse between runs.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from pango_aliasor.aliasor import Aliasor
+
+
+class PangoAliases:
+    """
+    Memoized Pango alias resolution with the same `uncompress` and `parent`
+    methods as `Aliasor`.
+
+    *alias_key* is the path to a local Pango alias key JSON file. If it is
+    None, the latest alias key is downloaded from GitHub by `Aliasor`.
+
+    *cache* is an optional path to a JSON file of previously resolved
+    lineages. It is loaded if it exists and was resolved with the same alias
+    key, and is updated with newly resolved lineages by `save`.
+    """
+    def __init__(self, alias_key=None, cache=None):
+        self.aliasor = Aliasor(alias_key)
+        self.cache = cache
+        self.alias_key_hash = hashlib.sha256(
+            json.dumps(self.aliasor.alias_dict, sort_keys=True).encode()
+        ).hexdigest()
+
+        self.uncompressed = {}
+        self.parents = {}
+        self.depths = {}
+
+        self._load_cache()
+        self.cached_lineages = len(self.uncompressed) + len(self.parents)
+
+    def _load_cache(self):
+        """
+        Add the lineages in the cache that were resolved with the same alias
+        key to the resolved lineages.
+        """
+        if not self.cache or not os.path.exists(self.cache):
+            return
+
+        with open(self.cache, "r") as fh:
+            cached = json.load(fh)
+
+        if cached.get("alias_key_hash") == self.alias_key_hash:
+            self.uncompressed = {**cached["uncompressed"], **self.uncompressed}
+            self.parents = {**cached["parents"], **self.parents}
+
+    def uncompress(self, lineage):
+        if lineage not in self.uncompressed:
+            self.uncompressed[lineage] = self.aliasor.uncompress(lineage)
+        return self.uncompressed[lineage]
+
+    def parent(self, lineage):
+        """
+        Return the parent lineage in aliased format or '' if at top level.
+        """
+        if lineage not in self.parents:
+            self.parents[lineage] = self.aliasor.parent(lineage)
+        return self.parents[lineage]
+
+    def depth(self, lineage):
+        """
+        Return the number of levels in the uncompressed *lineage*.
+        """
+        if lineage not in self.depths:
+            self.depths[lineage] = len(self.uncompress(lineage).split("."))
+        return self.depths[lineage]
+
+    def save(self):
+        """
+        Save the resolved lineages to the cache, if there is a cache and
+        lineages have been resolved since it was loaded.
+
+        The cache may be shared by concurrent runs, so the lineages saved to
+        it since it was loaded are merged with the resolved lineages first.
+        """
+        if not self.cache or len(self.uncompressed) + len(self.parents) == self.cached_lineages:
+            return
+
+        self._load_cache()
+
+        cache_dir = os.path.dirname(os.path.abspath(self.cache))
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write to a temporary file first, so concurrent runs never read a
+        # partially written cache
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump({
+                    "alias_key_hash": self.alias_key_hash,
+                    "uncompressed": self.uncompressed,
+                    "parents": self.parents,
+                }, fh)
+            os.replace(tmp_path, self.cache)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.cached_lineages = len(self.uncompressed) + len(self.parents)
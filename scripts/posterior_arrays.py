@@ -0,0 +1,195 @@
+"""
+Save and load model posteriors as directories of binary arrays.
+
+`ef.PosteriorHandler.save_posterior` writes the samples of all sites of a
+posterior as nested JSON arrays, which are slow to write and parse and have to
+be read in full even when only one site is needed. Posterior arrays are saved
+as a directory with a ".posterior" extension that holds one `.npy` file per
+site and a small JSON header:
+
+    {
+        "name": "hierarchical",
+        "coords": {"date": [...], "forecast_date": [...], "variant": [...], "location": [...]},
+        "sites": {"freq": {"dtype": "<f4", "shape": [...], "dims": ["sample", "date", "variant", "location"]}, ...}
+    }
+
+The arrays are memory-mapped when they are loaded, so readers only read the
+pages of the sites and slices they use (e.g. the last samples of `freq`).
+
+Dims are labeled from the coordinates of the data a posterior was fit to, with
+a location dim for the last axis of hierarchical sites, a variant dim for the
+last axis of the remaining axes, and a date or forecast date dim for the axis
+after the samples. Axes that do not match a coordinate are labeled by their
+site and position (e.g. "ga_dim_1").
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+POSTERIOR_ARRAYS_EXTENSION = ".posterior"
+HEADER_FILENAME = "header.json"
+
+# Extensions of saved posteriors by the posterior_format setting of the models
+POSTERIOR_EXTENSIONS = {
+    "json": ".json",
+    "arrays": POSTERIOR_ARRAYS_EXTENSION,
+}
+
+
+def is_posterior_arrays(path):
+    """
+    Return whether the posterior at *path* is saved as posterior arrays, based
+    on its extension.
+    """
+    return os.path.splitext(str(path).rstrip("/"))[1].lower() == POSTERIOR_ARRAYS_EXTENSION
+
+
+def posterior_path(path, name, posterior_format):
+    """
+    Return the path of the saved posterior *name* in the models directory of
+    the export *path*, in the *posterior_format*.
+    """
+    return f"{path}/models/{name}{POSTERIOR_EXTENSIONS[posterior_format]}"
+
+
+def _format_dates(dates):
+    return [pd.Timestamp(day).strftime("%Y-%m-%d") for day in dates]
+
+
+def _posterior_coords(samples, data):
+    """
+    Return the coordinates of the *samples* of a posterior fit to the *data*.
+    """
+    coords = {
+        "date": _format_dates(data.dates),
+        "variant": list(data.var_names),
+    }
+    if "freq_forecast" in samples:
+        import evofr as ef
+
+        coords["forecast_date"] = _format_dates(ef.data.forecast_dates(data.dates, np.shape(samples["freq_forecast"])[1]))
+
+    # Hierarchical data has one group of data per location
+    if hasattr(data, "names"):
+        coords["location"] = list(data.names)
+
+    return coords
+
+
+def _site_dims(site, shape, coords):
+    """
+    Return the labels of the dims of the *site* with *shape*, based on the
+    posterior *coords*.
+    """
+    if site == "losses":
+        return ["iteration"]
+
+    dims = ["sample"] + [f"{site}_dim_{axis}" for axis in range(1, len(shape))]
+    axes = list(range(1, len(shape)))
+
+    if "location" in coords and axes and shape[axes[-1]] == len(coords["location"]):
+        dims[axes.pop()] = "location"
+
+    if axes and shape[axes[-1]] == len(coords["variant"]):
+        dims[axes.pop()] = "variant"
+
+    if axes and axes[0] == 1:
+        if site.endswith("_forecast") and shape[1] == len(coords.get("forecast_date", [])):
+            dims[1] = "forecast_date"
+        elif shape[1] == len(coords["date"]):
+            dims[1] = "date"
+
+    return dims
+
+
+def save_posterior_arrays(posterior, path):
+    """
+    Save the samples of the *posterior* as posterior arrays at *path*,
+    replacing any posterior previously saved there.
+    """
+    coords = _posterior_coords(posterior.samples, posterior.data)
+    header = {"name": posterior.name, "coords": coords, "sites": {}}
+
+    # Write to a temporary directory first, so a failed save does not leave a
+    # mix of old and new sites
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".", suffix=".tmp")
+    try:
+        for site, samples in posterior.samples.items():
+            samples = np.asarray(samples)
+            np.save(os.path.join(tmp_path, f"{site}.npy"), samples)
+            header["sites"][site] = {
+                "dtype": samples.dtype.str,
+                "shape": list(samples.shape),
+                "dims": _site_dims(site, samples.shape, coords),
+            }
+
+        with open(os.path.join(tmp_path, HEADER_FILENAME), "w", encoding="utf-8") as fh:
+            json.dump(header, fh)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+
+
+def read_posterior_header(path):
+    """
+    Return the header of the posterior arrays at *path*.
+    """
+    with open(os.path.join(path, HEADER_FILENAME), "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def load_posterior_arrays(path, sites=None, mmap_mode="r"):
+    """
+    Return a dict of the samples of the *sites* of the posterior arrays at
+    *path*, or of all of its sites if *sites* is None. Arrays are memory-mapped
+    with the *mmap_mode* of `np.load`, which is read-only by default.
+    """
+    header = read_posterior_header(path)
+    if sites is None:
+        sites = list(header["sites"])
+
+    missing_sites = set(sites) - set(header["sites"])
+    if missing_sites:
+        raise KeyError(f"Posterior arrays {path!r} have no sites {sorted(missing_sites)!r}")
+
+    return {
+        site: np.load(os.path.join(path, f"{site}.npy"), mmap_mode=mmap_mode)
+        for site in sites
+    }
+
+
+def save_posterior(posterior, path):
+    """
+    Save the *posterior* at *path* as posterior arrays or with
+    `ef.PosteriorHandler.save_posterior`, based on the extension of *path*.
+    """
+    if is_posterior_arrays(path):
+        save_posterior_arrays(posterior, path)
+    else:
+        posterior.save_posterior(path)
+
+
+def load_posterior(posterior, path):
+    """
+    Load the samples of the *posterior* from *path* as posterior arrays or
+    with `ef.PosteriorHandler.load_posterior`, based on the extension of
+    *path*. Samples loaded from JSON are converted from nested lists to
+    arrays, like the samples of fits.
+    """
+    if is_posterior_arrays(path):
+        posterior.samples = load_posterior_arrays(path)
+    else:
+        posterior.load_posterior(path)
+        posterior.samples = {site: np.asarray(samples) for site, samples in posterior.samples.items()}
+
+    return posterior
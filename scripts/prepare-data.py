@@ -3,10 +3,14 @@ Prepare case counts and clade counts data for analysis by subsetting to
 specific date range and locations, pruning recent clade counts, and collapsing clades.
 """
 import argparse
+import json
+import numpy as np
 import pandas as pd
 import sys
 
 from datetime import datetime, timedelta
+from functools import lru_cache
+from count_tables import read_counts, read_counts_subset, write_counts
 
 CASES_DTYPES = {
     'location': 'string',
@@ -22,6 +26,32 @@ SEQ_COUNTS_DTYPES = {
 # Default cutoff date is today's date
 DEFAULT_CUTOFF_DATE = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
 
+# Input and output paths required for each `--target`
+TARGET_PATHS = ('seq_counts', 'cases', 'output_seq_counts', 'output_cases')
+
+# Options and their defaults for each `--target`, which use the same keys as
+# config['prepare_data'] in the workflow
+TARGET_OPTIONS = {
+    'max_date': DEFAULT_CUTOFF_DATE,
+    'included_days': None,
+    'prune_seq_days': None,
+    'location_min_seq': 1,
+    'location_min_seq_days': None,
+    'excluded_locations': None,
+    'clade_min_seq': None,
+    'clade_min_seq_days': None,
+    'force_include_clades': None,
+}
+
+TARGET_INT_OPTIONS = (
+    'included_days',
+    'prune_seq_days',
+    'location_min_seq',
+    'location_min_seq_days',
+    'clade_min_seq',
+    'clade_min_seq_days',
+)
+
 
 def positive_int(value):
     """
@@ -35,64 +65,124 @@ def positive_int(value):
     return int_value
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(__doc__,
-        formatter_class=argparse.RawTextHelpFormatter)
+def parse_target(value):
+    """
+    Parse the JSON *value* of a `--target` option into an argparse.Namespace
+    with the input and output paths of the target and its options.
+    """
+    try:
+        target = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise argparse.ArgumentTypeError(f"Unable to parse target {value!r}: {e}")
 
-    parser.add_argument("--seq-counts", metavar="TSV", required=True,
-        help="Path to clade counts TSV with four columns: 'location','clade','date','sequences'")
-    parser.add_argument("--cases", metavar="TSV", required=True,
-        help="Path to case counts TSV with three columns: 'location','date','cases'")
-    parser.add_argument("--max-date", default=DEFAULT_CUTOFF_DATE,
-        help="The maximum cutoff for date (inclusive), formatted as 'YYYY-MM-DD'.\n"
-             "(default: %(default)s)")
-    parser.add_argument("--included-days", type=positive_int,
-        help="The number of days (including the cutoff date) to include in analysis.\n"
-             "If not provided, all data through the cutoff date will be included.")
-    parser.add_argument("--prune-seq-days", type=positive_int,
-        help="The number of days (including the cutoff date) to prune sequence counts.\n"
-             "This is useful to exclude sequence counts for recent days that are overly enriched for variants.")
-    parser.add_argument("--location-min-seq", type=positive_int, default=1,
-        help="The mininum number of sequences a location must have within the "
-             "days-min-seq to be included in analysis.\n"
-             "(default: %(default)s)")
-    parser.add_argument("--location-min-seq-days", type=positive_int,
-        help="The number of days (counting back from the cutoff date) to use as the date range "
-             "for counting the number of sequences per location to determine if a location is included in analysis.\n"
-             "If not provided, will count sequences from all dates included in analysis date range.")
-    parser.add_argument("--excluded-locations",
-        help="File with a list of locations to exclude from analysis.")
-    parser.add_argument("--clade-min-seq", type=positive_int,
-        help="The minimum number of sequences a clades must have to be included as it's own variant.\n"
-             "All clades with less than the minimum will be collapsed as 'other'.")
-    parser.add_argument("--clade-min-seq-days", type=positive_int,
-        help="The number fo days (counting back from the cutoff date) to use as the date range "
-             "for counting the number of sequences per clade to determine if a clade is included as its own variant.\n"
-             "If not provided, will count sequences from all dates included in analysis date range.")
-    parser.add_argument("--force-include-clades",
-        help="TSV file with a list of clade/variant pairs to force include in the output regardless of sequences counts. " +
-             "Each line in the file must be formatted as '<clade_name>\t<variant_name>'")
-    parser.add_argument("--output-seq-counts", required=True,
-        help="Path to output TSV file for the prepared variants data.")
-    parser.add_argument("--output-cases", required=True,
-        help="Path to output TSV file for the prepared cases data.")
+    if not isinstance(target, dict):
+        raise argparse.ArgumentTypeError(f"Target {value!r} must be a JSON object.")
+
+    unknown_keys = set(target) - set(TARGET_PATHS) - set(TARGET_OPTIONS)
+    if unknown_keys:
+        raise argparse.ArgumentTypeError(f"Target {value!r} has unknown keys: {sorted(unknown_keys)}.")
+
+    for required_key in TARGET_PATHS:
+        if not target.get(required_key):
+            raise argparse.ArgumentTypeError(f"Target {value!r} must include {required_key!r}.")
+
+    target = {**TARGET_OPTIONS, **target}
+    for option in TARGET_INT_OPTIONS:
+        if target[option] is not None:
+            target[option] = positive_int(target[option])
+
+    return argparse.Namespace(**target)
+
+
+def index_seq_counts(seq_counts):
+    """
+    Sort the *seq_counts* by date and dictionary-encode the location and
+    clade columns, so date ranges can be selected by binary search and
+    sequences can be summed per location or clade with `np.bincount`.
+
+    Returns the sorted *seq_counts* and a dict of the integer codes and
+    unique values of the location and clade columns. Codes are shifted by
+    one so that missing values have the code 0.
+    """
+    seq_counts = seq_counts.sort_values('date', kind='mergesort', ignore_index=True)
+
+    index = {}
+    for column in ('location', 'clade'):
+        codes, uniques = pd.factorize(seq_counts[column])
+        index[column] = (codes + 1, uniques)
+
+    return seq_counts, index
+
+
+def date_window(dates, min_date, max_date):
+    """
+    Return a slice of the sorted *dates* from *min_date* to *max_date*
+    (inclusive). If *min_date* is None, the slice starts at the first date.
+    """
+    start = dates.searchsorted(np.datetime64(min_date), side='left') if min_date else 0
+    stop = dates.searchsorted(np.datetime64(max_date), side='right')
+    return slice(start, stop)
+
+
+def sum_sequences_per_value(seq_counts, index, column, window):
+    """
+    Sum the sequences of the *seq_counts* rows in the date *window* for each
+    value of the indexed *column*.
+
+    Returns a DataFrame with the *column* and 'sequences' columns for values
+    that have rows in the date *window*, sorted by the *column*.
+    """
+    codes, uniques = index[column]
+    window_codes = codes[window]
+    n_codes = len(uniques) + 1
+    row_counts = np.bincount(window_codes, minlength=n_codes)
+    sequences = np.bincount(
+        window_codes,
+        weights=seq_counts['sequences'].to_numpy()[window],
+        minlength=n_codes,
+    ).astype('int64')
+
+    # Skip missing values and values without rows in the date window
+    present = row_counts[1:] > 0
+    return pd.DataFrame({
+        column: uniques[present],
+        'sequences': sequences[1:][present],
+    }).sort_values(column, ignore_index=True)
+
+
+@lru_cache(maxsize=None)
+def read_indexed_seq_counts(path):
+    """
+    Read the sequence counts at *path* and index them with
+    `index_seq_counts`. Results are cached so targets that share the same
+    sequence counts only read them once.
+    """
+    seq_counts = read_counts(path, parse_dates=['date'], dtype=SEQ_COUNTS_DTYPES)
+    return index_seq_counts(seq_counts)
 
-    args = parser.parse_args()
 
+def prepare_seq_counts(options):
+    """
+    Prepare the sequence counts of a single target, where the *options* have
+    the same attributes as the command line arguments.
+
+    Returns the min date, max date and locations to include for subsetting
+    the case counts of the target with `prepare_cases`.
+    """
     ###########################################################################
     ##################### Rules for subsetting by date ########################
     ###########################################################################
     # Max date to include for analysis
-    print(f"Setting max date (inclusive) as {args.max_date!r}.")
-    max_date = datetime.strptime(args.max_date, '%Y-%m-%d')
+    print(f"Setting max date (inclusive) as {options.max_date!r}.")
+    max_date = datetime.strptime(options.max_date, '%Y-%m-%d')
 
     # The min date is shared between the seq_counts and cases data
     # Set default min_date to minimum date possible so we include all data up to the max date
     min_date = None
-    if args.included_days is not None:
+    if options.included_days is not None:
         # Calculate the minimum date as *included_days* days before the max date
         # Subtract 1 from days in calculation since we are including the max date
-        min_date = max_date - timedelta(days=(args.included_days - 1))
+        min_date = max_date - timedelta(days=(options.included_days - 1))
         print(f"Setting min date (inclusive) as {datetime.strftime(min_date, '%Y-%m-%d')!r}.")
     else:
         print("No min date was set, including all dates up to the max date.")
@@ -101,41 +191,42 @@ if __name__ == '__main__':
     ################### Rules for subsetting by location ######################
     ###########################################################################
     # Load entire clade counts data since we need to to find all locations
-    seq_counts = pd.read_csv(args.seq_counts, sep='\t', parse_dates=['date'], dtype=SEQ_COUNTS_DTYPES)
+    seq_counts, seq_counts_index = read_indexed_seq_counts(options.seq_counts)
+    seq_counts_dates = seq_counts['date'].to_numpy()
 
     # Set the min_date as the default min date for counting sequences per location
     # to count sequences per location over the entire analysis date range
     min_location_seq_date = min_date
-    if args.location_min_seq_days is not None:
+    if options.location_min_seq_days is not None:
         print(
-            f"Only including locations that have at least {args.location_min_seq} sequence(s)",
-            f"in the last {args.location_min_seq_days} days of the analysis date range."
+            f"Only including locations that have at least {options.location_min_seq} sequence(s)",
+            f"in the last {options.location_min_seq_days} days of the analysis date range."
         )
         # Calculate the minimum date for sequences per location as *location_min_seq_days* before the max date
         # Subtract 1 from days in calculation since we are including the max date
-        min_location_seq_date = max_date - timedelta(days=(args.location_min_seq_days - 1))
+        min_location_seq_date = max_date - timedelta(days=(options.location_min_seq_days - 1))
     else:
         print(
-            f"Only including locations that have at least {args.location_min_seq} sequence(s)",
+            f"Only including locations that have at least {options.location_min_seq} sequence(s)",
             "in the analysis date range."
         )
 
     # Subset to locations and sequences within the date range from min_location_seq_date to max_date
     # and group by location to get the total number of sequences per location in this date range
-    location_and_seqs = seq_counts.loc[
-        (seq_counts['date'] >= min_location_seq_date if min_location_seq_date else True) &
-        (seq_counts['date'] <= max_date),
-        ['location', 'sequences']
-    ]
-    seqs_per_location = location_and_seqs.groupby(['location'], as_index=False).sum()
+    seqs_per_location = sum_sequences_per_value(
+        seq_counts,
+        seq_counts_index,
+        'location',
+        date_window(seq_counts_dates, min_location_seq_date, max_date),
+    )
 
     # Get a set of locations that meet the location_min_seq requirement
-    locations_with_min_seq = set(seqs_per_location.loc[seqs_per_location['sequences'] >= args.location_min_seq, 'location'])
+    locations_with_min_seq = set(seqs_per_location.loc[seqs_per_location['sequences'] >= options.location_min_seq, 'location'])
 
     # Load manually annotated excluded locations if provided
     excluded_locations = set()
-    if args.excluded_locations:
-        with open(args.excluded_locations, 'r') as f:
+    if options.excluded_locations:
+        with open(options.excluded_locations, 'r') as f:
             excluded_locations = {line.rstrip() for line in f}
 
         print(f"Excluding the following requested locations: {sorted(excluded_locations)}.")
@@ -152,13 +243,16 @@ if __name__ == '__main__':
     ############## Rules for collapsing clades to variants ####################
     ###########################################################################
 
-    # Duplicate 'clade' column to 'variant' column to faciliate mapping to 'other'
-    seq_counts['variant'] = seq_counts.loc[:, 'clade']
+    # Resolve the variant of each distinct clade once, so the variants of the
+    # sequence counts can be recoded from their clade codes in a single step
+    clade_codes, clades = seq_counts_index['clade']
+    clade_variants = np.asarray(clades, dtype=object).copy()
 
     # Keep track of clades that are force included so that they can bypass the sequence counts check
     force_included_clades = set()
-    if args.force_include_clades:
-        with open(args.force_include_clades, 'r') as f:
+    force_included_variants = {}
+    if options.force_include_clades:
+        with open(options.force_include_clades, 'r') as f:
             for force_include_clade in f:
                 force_include = force_include_clade.rstrip().split('\t')
                 if len(force_include) != 2:
@@ -166,55 +260,54 @@ if __name__ == '__main__':
                     sys.exit(1)
 
                 clade, variant = force_include
-                seq_counts.loc[seq_counts['clade'] == clade, 'variant'] = variant
+                force_included_variants[clade] = variant
                 force_included_clades.add(clade)
 
+        clade_variants = np.array([force_included_variants.get(clade, clade) for clade in clade_variants], dtype=object)
         print(f"Force including the following clades: {sorted(force_included_clades)}")
 
     # Collapse small clades into "other" if clades-min-seq is provided
-    if args.clade_min_seq:
+    if options.clade_min_seq:
         # Set the min_date as the default min date for counting sequences per clade
         # to count sequences per clade over the entire analysis date range
         min_clades_seq_date = min_date
-        if args.clade_min_seq_days is not None:
+        if options.clade_min_seq_days is not None:
             print(
-                f"Collapsing clades that have less than {args.clade_min_seq} sequence(s)",
-                f"in the last {args.clade_min_seq_days} days of the analysis date range into a single 'other' variant."
+                f"Collapsing clades that have less than {options.clade_min_seq} sequence(s)",
+                f"in the last {options.clade_min_seq_days} days of the analysis date range into a single 'other' variant."
             )
             # Calculate the minimum date for sequences per clade as *clade_min_seq_days* before the max date
             # Subtract 1 from days in calculation since we are including the max date
-            min_clades_seq_date = max_date - timedelta(days=(args.clade_min_seq_days - 1))
+            min_clades_seq_date = max_date - timedelta(days=(options.clade_min_seq_days - 1))
         else:
             print(
-                f"Collapsing clades that have less than {args.clade_min_seq} sequence(s)",
+                f"Collapsing clades that have less than {options.clade_min_seq} sequence(s)",
                 "in the analysis date range (inclusive) into a single 'other' variant."
             )
 
         # Subset to clades and sequences within the date range from min_clades_seq_date to max_date
         # and group by clade to get the total number of sequences per clade in this date range
-        clades_and_seqs = seq_counts.loc[
-            (seq_counts['date'] >= min_clades_seq_date if min_clades_seq_date else True) &
-            (seq_counts['date'] <= max_date),
-            ['clade', 'sequences']
-        ]
-        seqs_per_clade = clades_and_seqs.groupby(['clade'], as_index=False).sum()
+        seqs_per_clade = sum_sequences_per_value(
+            seq_counts,
+            seq_counts_index,
+            'clade',
+            date_window(seq_counts_dates, min_clades_seq_date, max_date),
+        )
 
         # Get a set of clades that meet the clade_min_seq requirement
-        clades_with_min_seq = set(seqs_per_clade.loc[seqs_per_clade['sequences'] >= args.clade_min_seq, 'clade'])
+        clades_with_min_seq = set(seqs_per_clade.loc[seqs_per_clade['sequences'] >= options.clade_min_seq, 'clade'])
 
         # Replace variant with 'other' if they are not force included and do not meet the clade_min_seq requirement
-        seq_counts.loc[~seq_counts['clade'].isin(force_included_clades | clades_with_min_seq), 'variant'] = 'other'
+        clade_variants[~clades.isin(force_included_clades | clades_with_min_seq)] = 'other'
 
     # Replace 'recombinant' clade with 'other' if it hasn't been explicitly force-included.
     if "recombinant" not in force_included_clades:
-        seq_counts.loc[seq_counts['clade'].isin(['recombinant']), 'variant'] = 'other'
-
-    # Add clades with unknown variants to 'other' variant group
-    seq_counts.loc[pd.isna(seq_counts['variant']), 'variant'] = 'other'
+        clade_variants[clades.isin(['recombinant'])] = 'other'
 
-    # Collapse the variants of the same location and date
-    seq_counts = seq_counts.groupby(['location', 'variant', 'date'], as_index=False).sum(numeric_only=False)
-    seq_counts.drop(columns=['clade'], inplace=True)
+    # Add clades with unknown variants to 'other' variant group, where the
+    # code 0 is used for missing clades
+    clade_variants = np.concatenate([['other'], clade_variants])
+    clade_variant_codes, variants = pd.factorize(clade_variants, sort=True)
 
 
     ###########################################################################
@@ -224,24 +317,36 @@ if __name__ == '__main__':
     # The default max date for clade counts is the max date
     max_clade_date = max_date
     # Set the max date for clade counts to earlier date if prune_seq_days is provided.
-    if args.prune_seq_days is not None:
+    if options.prune_seq_days is not None:
         print(
-            f"Pruning variants counts in the last {args.prune_seq_days} day(s)",
+            f"Pruning variants counts in the last {options.prune_seq_days} day(s)",
             "to exclude recent dates that may be overly enriched for variants."
         )
         # Calculate max clade date as *prune_seq_days* days before the max_date
-        max_clade_date = max_date - timedelta(days=(args.prune_seq_days))
+        max_clade_date = max_date - timedelta(days=(options.prune_seq_days))
 
     ###########################################################################
     ########################## Subset and output data #########################
     ###########################################################################
 
-    # Subset the clade counts data by date and locations
-    seq_counts = seq_counts.loc[
-        (seq_counts['date'] >= min_date if min_date else True) &
-        (seq_counts['date'] <= max_clade_date) &
-        (seq_counts['location'].isin(locations_to_include))
-    ]
+    # Subset the clade counts data by date and locations, using the date sorted
+    # index to slice the date range and the location codes to select locations
+    location_codes, locations = seq_counts_index['location']
+    include_location_code = np.concatenate([[False], locations.isin(locations_to_include)])
+    included_dates = date_window(seq_counts_dates, min_date, max_clade_date)
+    included_rows = included_dates.start + np.flatnonzero(include_location_code[location_codes[included_dates]])
+
+    # Recode the clades of the included rows to their variants as a categorical
+    # column, where the categories are sorted so variants sort by name
+    seq_counts = seq_counts.iloc[included_rows].drop(columns=['clade'])
+    seq_counts['variant'] = pd.Categorical.from_codes(
+        clade_variant_codes[clade_codes[included_rows]],
+        categories=variants,
+    )
+
+    # Collapse the variants of the same location and date
+    seq_counts = seq_counts.groupby(['location', 'variant', 'date'], as_index=False, observed=True).sum()
+    seq_counts['variant'] = seq_counts['variant'].astype('string')
 
     included_variants = seq_counts['variant'].unique()
     print(f"Variants that will be included: {sorted(included_variants)}.")
@@ -250,26 +355,131 @@ if __name__ == '__main__':
         "All variants have been excluded. Try again with different options, e.g. lowering the `--clade-min-seq` cutoff."
 
     # Sort variants subset and print to output file
-    seq_counts.sort_values(['location', 'variant', 'date']) \
-          .to_csv(
-              args.output_seq_counts,
-              sep='\t',
-              index=False,
-          )
-
-
-    # Load entire case counts data
-    cases = pd.read_csv(args.cases, sep='\t', parse_dates=['date'], dtype=CASES_DTYPES)
-    # Subset the case counts data by date and locations
-    cases = cases.loc[
-        (cases['date'] >= min_date if min_date else True) &
-        (cases['date'] <= max_date) &
-        (cases['location'].isin(locations_to_include))
-    ]
-    # Sort cases subset and print to output file
-    cases.sort_values(['location', 'date']) \
-         .to_csv(
-             args.output_cases,
-             sep='\t',
-             index=False,
-         )
+    write_counts(
+        seq_counts.sort_values(['location', 'variant', 'date']),
+        options.output_seq_counts,
+    )
+
+    return min_date, max_date, locations_to_include
+
+
+def prepare_cases(path, targets):
+    """
+    Prepare the case counts at *path* for the *targets*, which are tuples of
+    the target options and the min date, max date and locations to include
+    returned by `prepare_seq_counts`.
+
+    The case counts are read once for all *targets*, keeping only the rows
+    within their combined date range and locations while reading.
+    """
+    min_dates = [min_date for _, min_date, _, _ in targets]
+    cases = read_counts_subset(
+        path,
+        set().union(*(locations_to_include for _, _, _, locations_to_include in targets)),
+        min_date=None if None in min_dates else min(min_dates),
+        max_date=max(max_date for _, _, max_date, _ in targets),
+        dtype=CASES_DTYPES,
+    )
+
+    for options, min_date, max_date, locations_to_include in targets:
+        # Subset the case counts data by date and locations
+        target_cases = cases.loc[
+            (cases['date'] >= min_date if min_date else True) &
+            (cases['date'] <= max_date) &
+            (cases['location'].isin(locations_to_include))
+        ]
+        # Sort cases subset and print to output file
+        write_counts(
+            target_cases.sort_values(['location', 'date']),
+            options.output_cases,
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(__doc__,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("--seq-counts", metavar="TSV",
+        help="Path to clade counts TSV or Parquet file with four columns: 'location','clade','date','sequences'")
+    parser.add_argument("--cases", metavar="TSV",
+        help="Path to case counts TSV or Parquet file with three columns: 'location','date','cases'")
+    parser.add_argument("--max-date", default=DEFAULT_CUTOFF_DATE,
+        help="The maximum cutoff for date (inclusive), formatted as 'YYYY-MM-DD'.\n"
+             "(default: %(default)s)")
+    parser.add_argument("--included-days", type=positive_int,
+        help="The number of days (including the cutoff date) to include in analysis.\n"
+             "If not provided, all data through the cutoff date will be included.")
+    parser.add_argument("--prune-seq-days", type=positive_int,
+        help="The number of days (including the cutoff date) to prune sequence counts.\n"
+             "This is useful to exclude sequence counts for recent days that are overly enriched for variants.")
+    parser.add_argument("--location-min-seq", type=positive_int, default=1,
+        help="The mininum number of sequences a location must have within the "
+             "days-min-seq to be included in analysis.\n"
+             "(default: %(default)s)")
+    parser.add_argument("--location-min-seq-days", type=positive_int,
+        help="The number of days (counting back from the cutoff date) to use as the date range "
+             "for counting the number of sequences per location to determine if a location is included in analysis.\n"
+             "If not provided, will count sequences from all dates included in analysis date range.")
+    parser.add_argument("--excluded-locations",
+        help="File with a list of locations to exclude from analysis.")
+    parser.add_argument("--clade-min-seq", type=positive_int,
+        help="The minimum number of sequences a clades must have to be included as it's own variant.\n"
+             "All clades with less than the minimum will be collapsed as 'other'.")
+    parser.add_argument("--clade-min-seq-days", type=positive_int,
+        help="The number fo days (counting back from the cutoff date) to use as the date range "
+             "for counting the number of sequences per clade to determine if a clade is included as its own variant.\n"
+             "If not provided, will count sequences from all dates included in analysis date range.")
+    parser.add_argument("--force-include-clades",
+        help="TSV file with a list of clade/variant pairs to force include in the output regardless of sequences counts. " +
+             "Each line in the file must be formatted as '<clade_name>\t<variant_name>'")
+    parser.add_argument("--output-seq-counts",
+        help="Path to output TSV file for the prepared variants data.\n"
+             "Written as a Parquet file instead if the path ends with '.parquet'.")
+    parser.add_argument("--output-cases",
+        help="Path to output TSV file for the prepared cases data.\n"
+             "Written as a Parquet file instead if the path ends with '.parquet'.")
+
+    parser.add_argument("--target", type=parse_target, action="append", dest="targets",
+        help="JSON object of a target to prepare with the keys " +
+             f"{', '.join(map(repr, TARGET_PATHS))} and any options of {', '.join(map(repr, TARGET_OPTIONS))}, " +
+             "which use the same names as the options above with underscores instead of dashes.\n"
+             "Repeat this option to prepare multiple targets in a single process, sharing the parsed "
+             "sequence counts and case counts across targets that use the same input files.\n"
+             "Cannot be used with the single target options above.")
+
+    args = parser.parse_args()
+
+    if args.targets:
+        # Single target options are rejected unless they are left at their defaults
+        single_target_args = [f"--{path.replace('_', '-')}" for path in TARGET_PATHS if getattr(args, path)]
+        single_target_args += [
+            f"--{option.replace('_', '-')}"
+            for option in TARGET_OPTIONS
+            if getattr(args, option) != parser.get_default(option)
+        ]
+        if single_target_args:
+            parser.error(f"{', '.join(single_target_args)} cannot be used with --target.")
+
+        targets = args.targets
+    else:
+        missing_args = [f"--{path.replace('_', '-')}" for path in TARGET_PATHS if not getattr(args, path)]
+        if missing_args:
+            parser.error(f"the following arguments are required: {', '.join(missing_args)}")
+
+        targets = [args]
+
+    prepared_targets = []
+    for target in targets:
+        if args.targets:
+            print(f"Preparing {target.output_seq_counts!r} and {target.output_cases!r}.")
+        prepared_targets.append((target, *prepare_seq_counts(target)))
+
+    # Prepare the case counts after the sequence counts of all targets, so
+    # each case counts file is only read once for the targets that share it
+    for cases_path in dict.fromkeys(target.cases for target in targets):
+        prepare_cases(cases_path, [
+            prepared_target
+            for prepared_target in prepared_targets
+            if prepared_target[0].cases == cases_path
+        ])
+
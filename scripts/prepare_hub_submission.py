@@ -7,13 +7,17 @@ import numpy as np
 import pandas as pd
 import sys
 
+from count_tables import is_parquet
+from posterior_arrays import is_posterior_arrays, load_posterior_arrays
+from results_tables import read_results_metadata
+
 MAX_PRECISION = 6
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("--hub-tasks", required=True, help="JSON of hub tasks with list of target dates, clades, and locations to estimate frequencies for")
-    parser.add_argument("--model", required=True, help="JSON representing main model outputs from evofr")
-    parser.add_argument("--posterior", required=True, help="JSON of posterior samples corresponding to the given main model's parameters")
+    parser.add_argument("--model", required=True, help="JSON or Parquet results table representing main model outputs from evofr")
+    parser.add_argument("--posterior", required=True, help="JSON or posterior arrays directory of posterior samples corresponding to the given main model's parameters")
     parser.add_argument("--state-to-abbreviation-map", required=True, help="CSV mapping full US state and territory names to two-letter abbreviations")
     parser.add_argument("--output", required=True, help="parquet file representing posterior samples of frequencies for the target dates, clades, and locations")
 
@@ -41,19 +45,24 @@ if __name__ == '__main__':
     print(f"Extract {min_samples} samples from the posterior")
     print()
 
-    # Extract the list of dates, clades, and locations estimated from the main model JSON.
+    # Extract the list of dates, clades, and locations estimated from the main model metadata.
+    # Results tables store their metadata separately from the estimates, so
+    # only the metadata is read.
     print("Loading model")
-    with open(args.model, "r", encoding="utf-8") as fh:
-        model = json.load(fh)
-
-    model_dates = model["metadata"]["dates"]
-    model_forecast_dates = model["metadata"]["forecast_dates"]
+    if is_parquet(args.model):
+        model_metadata = read_results_metadata(args.model)
+    else:
+        with open(args.model, "r", encoding="utf-8") as fh:
+            model_metadata = json.load(fh)["metadata"]
+
+    model_dates = model_metadata["dates"]
+    model_forecast_dates = model_metadata["forecast_dates"]
     model_locations = [
         location
-        for location in model["metadata"]["location"]
+        for location in model_metadata["location"]
         if location != "hierarchical"
     ]
-    model_clades = model["metadata"]["variants"]
+    model_clades = model_metadata["variants"]
 
     print(f"Model nowcast dates: {len(model_dates)} spanning from {model_dates[0]} to {model_dates[-1]}")
     print(f"Model forecast dates: {len(model_forecast_dates)} spanning from {model_forecast_dates[0]} to {model_forecast_dates[-1]}")
@@ -65,7 +74,7 @@ if __name__ == '__main__':
     # Any modeled clades that aren't required should be labeled as "other".
     missing_clades = set(clades) - set(model_clades) - {"other"}
     if len(missing_clades) > 0:
-        print(f"ERROR: The following required clades are missing from the model JSON: {missing_clades}", file=sys.stderr)
+        print(f"ERROR: The following required clades are missing from the model results: {missing_clades}", file=sys.stderr)
         sys.exit(1)
 
     modeled_clade_to_required_clade = {clade: clade for clade in clades}
@@ -84,12 +93,16 @@ if __name__ == '__main__':
     )
 
     # Extract the required number of samples from the posterior for estimated
-    # current and future frequencies. The posterior JSON contains one set of
+    # current and future frequencies. The posterior contains one set of
     # nested arrays per parameter (e.g., freq, freq_forecast, ga, etc.) in the
     # shape of (N_SAMPLES, N_DATES, N_VARIANTS, N_LOCATIONS) with "hierarchical"
-    # included as one of the locations.
-    with open(args.posterior, "r", encoding="utf-8") as fh:
-        posterior = json.load(fh)
+    # included as one of the locations. Posterior arrays are memory-mapped, so
+    # only the samples used below are read.
+    if is_posterior_arrays(args.posterior):
+        posterior = load_posterior_arrays(args.posterior, sites=["freq", "freq_forecast"])
+    else:
+        with open(args.posterior, "r", encoding="utf-8") as fh:
+            posterior = json.load(fh)
 
     # Select the latest N samples from the posterior.
     posterior_frequencies = posterior["freq"][-min_samples:]
@@ -125,7 +138,7 @@ if __name__ == '__main__':
                         value = 0.0
                     else:
                         clade_index = model_clades.index(clade)
-                        value = round(frequency_data[sample_index][date_index][clade_index][location_index], MAX_PRECISION)
+                        value = round(float(frequency_data[sample_index][date_index][clade_index][location_index]), MAX_PRECISION)
 
                     records.append({
                         "nowcast_date": nowcast_date,
@@ -0,0 +1,160 @@
+"""
+Write and read model results as columnar Parquet tables.
+
+The model scripts export their results as a tidy JSON with one object per
+estimate. Results tables hold the same estimates with one row per estimate in
+typed columns:
+
+    location, site, variant, ps: dictionary-encoded strings
+    date: date32, null for estimates that are not dated (e.g. growth advantages)
+    value: float64, null where the results JSON has null
+
+Like the tidy dicts of `ef.posterior.get_sites_variants_tidy`, results tables
+are built as dicts of "metadata" and "data", where the data is a DataFrame
+built from the arrays of estimates instead of one dict per estimate.
+
+The metadata of the results is stored as JSON in the metadata of the Parquet
+file, so readers can read the metadata without reading any estimates and can
+read a slice of the estimates (e.g. the frequencies of a few locations) by
+passing filters to the Parquet reader.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+
+RESULTS_COLUMNS = ["location", "site", "variant", "date", "ps", "value"]
+STRING_COLUMNS = ("location", "site", "variant", "ps")
+
+# Key of the results metadata in the Parquet file metadata
+METADATA_KEY = b"results_metadata"
+
+
+def round_values(values):
+    """
+    Round the *values* to 3 decimals like the results JSON, which rounds
+    values in their own precision before converting them to floats.
+    """
+    return np.around(np.around(np.asarray(values), decimals=3).astype(float), decimals=3)
+
+
+def make_table_data(location, site, variants, dates, ps_keys, values):
+    """
+    Return a DataFrame of the *values* of the *site* for the *location*, where
+    the *values* have the shape (variants, dates, ps_keys). Rows are ordered by
+    variant, date and ps key like the entries of the results JSON.
+    """
+    n_variants, n_dates, n_ps = values.shape
+    return pd.DataFrame({
+        "location": location,
+        "site": site,
+        "variant": np.repeat(np.asarray(variants, dtype=object), n_dates * n_ps),
+        "date": np.tile(np.repeat(pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy(), n_ps), n_variants),
+        "ps": np.tile(np.asarray(ps_keys, dtype=object), n_variants * n_dates),
+        "value": values.reshape(-1),
+    }, columns=RESULTS_COLUMNS)
+
+
+def get_sites_variants_table(samples, data, sites, dated, forecasts, ps, name):
+    """
+    Return the estimates of `ef.posterior.get_sites_variants_tidy` for the
+    *sites* of the *samples* as a results table.
+    """
+    import evofr as ef
+
+    ps_keys = ["median", "mean"]
+    for p in ps:
+        ps_keys.append(f"HDI_{round(p * 100)}_upper")
+        ps_keys.append(f"HDI_{round(p * 100)}_lower")
+
+    metadata = {
+        "ps": ps_keys,
+        "ps_point_estimator": "median",
+        "sites": sites,
+        "location": [name],
+        "dates": data.dates,
+        "variants": data.var_names,
+    }
+
+    # Forecast dates are based on the first dated forecast site
+    forecast_date_map = None
+    for is_dated, site, forecast in zip(dated, sites, forecasts):
+        if forecast and is_dated:
+            metadata["forecast_dates"] = ef.data.forecast_dates(data.dates, samples[site].shape[1])
+            forecast_date_map = {day: i for i, day in enumerate(metadata["forecast_dates"])}
+            break
+
+    tables = []
+    for is_dated, site, forecast in zip(dated, sites, forecasts):
+        # Estimates in the order of the results JSON, with the lower bound of
+        # each interval before the upper bound
+        med, quants = ef.posterior.get_quantiles(samples, ps, site)
+        means = ef.posterior.get_mean(samples, site)
+        site_ps_keys = ["median", "mean"]
+        values = [med, means]
+        for i, p in enumerate(ps):
+            site_ps_keys += [f"HDI_{round(p * 100)}_lower", f"HDI_{round(p * 100)}_upper"]
+            values += [quants[i][0], quants[i][1]]
+        values = round_values(np.stack([np.asarray(value) for value in values], axis=-1))
+
+        if is_dated:
+            date_map = forecast_date_map if forecast else data.date_to_index
+            dates = list(date_map)
+            values = values[list(date_map.values())].transpose(1, 0, 2)
+        else:
+            dates = [None]
+            values = values[:, None, :]
+
+        variants = list(data.var_names)[:values.shape[0]]
+        tables.append(make_table_data(name, site, variants, dates, site_ps_keys, values[:len(variants)]))
+
+    return {"metadata": metadata, "data": pd.concat(tables, ignore_index=True)}
+
+
+def combine_tables(tables):
+    """
+    Combine the metadata and data of the results *tables* like
+    `ef.posterior.combine_sites_tidy` combines tidy dicts.
+    """
+    import evofr as ef
+
+    metadata = ef.posterior.combine_sites_tidy([{"metadata": table["metadata"], "data": []} for table in tables])["metadata"]
+    return {"metadata": metadata, "data": pd.concat([table["data"] for table in tables], ignore_index=True)}
+
+
+def write_results_table(results, path):
+    """
+    Write the metadata and data of the *results* table to *path* as a Parquet
+    file.
+    """
+    import evofr as ef
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    data = results["data"]
+    columns = {}
+    for column in RESULTS_COLUMNS:
+        values = data[column]
+        if column in STRING_COLUMNS:
+            columns[column] = pa.array(values, type=pa.string(), from_pandas=True).dictionary_encode()
+        elif column == "date":
+            columns[column] = pa.array(values.dt.date, type=pa.date32(), from_pandas=True)
+        else:
+            columns[column] = pa.array(values, type=pa.float64(), from_pandas=True)
+
+    # Dates and other values of the metadata are encoded like the results JSON
+    table = pa.table(columns).replace_schema_metadata({
+        METADATA_KEY: json.dumps(results["metadata"], allow_nan=False, cls=ef.posterior.EvofrEncoder),
+    })
+    pq.write_table(table, path)
+
+
+def read_results_metadata(path):
+    """
+    Return the results metadata of the results table at *path*, without
+    reading any of its estimates.
+    """
+    import pyarrow.parquet as pq
+
+    return json.loads(pq.read_schema(path).metadata[METADATA_KEY])
+
@@ -7,7 +7,16 @@ import pandas as pd
 import os
 import yaml
 import json
+from types import SimpleNamespace
 import evofr as ef
+from jax import random
+from count_tables import is_parquet, read_counts
+from model_jobs import fit_locations, location_rng_key
+from batched_mlr import fit_nuts_from_map, fit_svi
+from fit_cache import cache_posterior, file_hash, fit_cache_enabled, fit_cache_key, load_cached_posterior
+from posterior_arrays import POSTERIOR_EXTENSIONS, load_posterior, posterior_path, save_posterior
+from results_tables import combine_tables, get_sites_variants_table, make_table_data, write_results_table
+from warm_start import init_to_MAP, load_warm_start, save_warm_start, warm_start_guide
 from datetime import date
 
 def parse_with_default(cf, var, dflt):
@@ -26,34 +35,78 @@ def parse_pool_scale(cf_m):
     return pool_scale
 
 class NUTS_from_MAP:
-    def __init__(self, num_warmup, num_samples, iters, lr):
+    def __init__(self, num_warmup, num_samples, iters, lr, warm_start_iters=None, warm_start_num_warmup=None):
         self.num_warmup = num_warmup
         self.num_samples = num_samples
         self.iters = iters
         self.lr = lr
-
-    def fit(self, model, data, name=None):
-        init_strat, _ = ef.init_to_MAP(model, data, iters=self.iters, lr=self.lr)
+        self.warm_start_iters = warm_start_iters or iters
+        self.warm_start_num_warmup = warm_start_num_warmup or num_warmup
+
+    def fit(self, model, data, name=None, init_values=None, rng_key=None):
+        map_key, nuts_key = random.split(rng_key) if rng_key is not None else (None, None)
+        if init_values is None:
+            init_strat, _ = init_to_MAP(model, data, None, iters=self.iters, lr=self.lr, rng_key=map_key)
+            num_warmup = self.num_warmup
+        else:
+            # Start close to the posterior, so a shorter MAP and warmup suffice
+            init_strat, _ = init_to_MAP(model, data, init_values, iters=self.warm_start_iters, lr=self.lr, rng_key=map_key)
+            num_warmup = self.warm_start_num_warmup
         inference_method = ef.InferNUTS(
-            num_warmup=self.num_warmup,
+            num_warmup=num_warmup,
             num_samples=self.num_samples,
             init_strategy=init_strat,
             dense_mass=True,
+            rng_key=nuts_key,
         )
         return inference_method.fit(model, data, name=name)
 
+    def fit_batched(self, model, datasets, names, rng_keys):
+        return fit_nuts_from_map(
+            model, datasets, names, rng_keys, iters=self.iters, lr=self.lr,
+            num_warmup=self.num_warmup, num_samples=self.num_samples
+        )
+
+
+class SVI_per_fit:
+    """
+    Creates a new SVI inference method for every fit, so each location is fit
+    from its own random state and the method can be sent to worker processes.
+    """
+    def __init__(self, infer_class, warm_start_iters=None, **kwargs):
+        self.infer_class = infer_class
+        self.warm_start_iters = warm_start_iters or kwargs["iters"]
+        self.kwargs = kwargs
+
+    def fit(self, model, data, name=None, init_values=None, rng_key=None):
+        if init_values is None:
+            return self.infer_class(**self.kwargs, rng_key=rng_key).fit(model, data, name=name)
+
+        # Start close to the posterior, so fewer iterations suffice
+        method = self.infer_class(**{**self.kwargs, "iters": self.warm_start_iters}, rng_key=rng_key)
+        method.guide_fn = warm_start_guide(method.guide_fn, init_values)
+        return method.fit(model, data, name=name)
+
+    def fit_batched(self, model, datasets, names, rng_keys):
+        method = self.infer_class(**self.kwargs)
+        return fit_svi(
+            model, datasets, names, rng_keys, guide_fn=method.guide_fn, iters=method.iters,
+            lr=self.kwargs["lr"], num_samples=method.num_samples
+        )
+
 
-def parse_inference_method(method_name, lr, iters, num_warmup, num_samples):
+def parse_inference_method(method_name, lr, iters, num_warmup, num_samples, warm_start_iters=None, warm_start_num_warmup=None):
     if method_name == "FullRank":
-        method = ef.InferFullRank(lr=lr, iters=iters, num_samples=num_samples)
+        method = SVI_per_fit(ef.InferFullRank, warm_start_iters, lr=lr, iters=iters, num_samples=num_samples)
     elif method_name == "MAP":
-        method = ef.InferMAP(lr=lr, iters=iters)
+        method = SVI_per_fit(ef.InferMAP, warm_start_iters, lr=lr, iters=iters)
     elif method_name == "NUTS":
         method = NUTS_from_MAP(
-            num_warmup=num_warmup, num_samples=num_samples, iters=iters, lr=lr
+            num_warmup=num_warmup, num_samples=num_samples, iters=iters, lr=lr,
+            warm_start_iters=warm_start_iters, warm_start_num_warmup=warm_start_num_warmup
         )
     else:  # Default is full rank
-        method = ef.InferFullRank(lr=lr, iters=iters, num_samples=num_samples)
+        method = SVI_per_fit(ef.InferFullRank, warm_start_iters, lr=lr, iters=iters, num_samples=num_samples)
     return method
 
 
@@ -72,8 +125,8 @@ class MLRConfig:
 
         # Load sequence count data
         seq_path = override_seq_path or data_cf["seq_path"]
-        if seq_path.endswith(".tsv"):
-            raw_seq = pd.read_csv(seq_path, sep="\t")
+        if is_parquet(seq_path) or seq_path.endswith(".tsv"):
+            raw_seq = read_counts(seq_path)
         else:
             raw_seq = pd.read_csv(seq_path)
 
@@ -116,10 +169,14 @@ class MLRConfig:
         num_samples = int(
             parse_with_default(infer_cf, "num_samples", dflt=1500)
         )
+        # Shorter optimization and warmup when warm starting from a previous fit
+        warm_start_iters = int(parse_with_default(infer_cf, "warm_start_iters", dflt=iters // 10))
+        warm_start_num_warmup = int(parse_with_default(infer_cf, "warm_start_num_warmup", dflt=num_warmup // 2))
 
         method_name = parse_with_default(infer_cf, "method", dflt="FullRank")
         inference_method = parse_inference_method(
-            method_name, lr, iters, num_warmup, num_samples
+            method_name, lr, iters, num_warmup, num_samples,
+            warm_start_iters, warm_start_num_warmup
         )
         return inference_method
 
@@ -131,35 +188,113 @@ class MLRConfig:
         export_json = parse_with_default(
             settings_cf, "export_json", dflt=False
         )
+        export_parquet = parse_with_default(
+            settings_cf, "export_parquet", dflt=False
+        )
         export_path = override_export_path or parse_with_default(
             settings_cf, "export_path", dflt=None
         )
-        return fit, save, load, export_json, export_path
+        return fit, save, load, export_json, export_parquet, export_path
+
+
+
+
+def forecast_frequencies(model, posterior):
+    n_days_to_present = (pd.to_datetime(date.today()) - posterior.data.dates[-1]).days
+    n_days_to_forecast = n_days_to_present + model.forecast_L
+    model.forecast_frequencies(posterior.samples, forecast_L=n_days_to_forecast)
 
 
+def fit_location(location, raw_seq, model, inference_method, pivot=None, warm_start_path=None, rng_key=None):
+    data = ef.VariantFrequencies(raw_seq=raw_seq, pivot=pivot)
 
+    # Load warm start from previous fit
+    init_values = load_warm_start(warm_start_path, model, data) if warm_start_path else None
+
+    # Fit model
+    posterior = inference_method.fit(model, data, name=location, init_values=init_values, rng_key=rng_key)
+
+    # Forecast frequencies
+    forecast_frequencies(model, posterior)
+
+    return posterior
+
+
+def load_cached_fit(key, model, data, name):
+    # Load posterior of a previous fit to the same data
+    posterior = load_cached_posterior(key, data, name)
+    if posterior is None:
+        return None
+
+    print(f"Loaded cached fit of {name}")
+
+    # Forecast frequencies from today's date
+    forecast_frequencies(model, posterior)
+
+    return posterior
+
+
+def fit_batched(tasks, model, inference_method, pivot=None):
+    if not tasks:
+        return []
+
+    datasets = [ef.VariantFrequencies(raw_seq=raw_seq, pivot=pivot) for _, raw_seq, *_ in tasks]
+
+    # Fit models of all locations at once
+    posteriors = inference_method.fit_batched(
+        model, datasets, [location for location, *_ in tasks], [task[-1] for task in tasks]
+    )
 
-def fit_models(rs, locations, model, inference_method, hier, path, save, pivot=None):
+    # Forecast frequencies
+    for posterior in posteriors:
+        forecast_frequencies(model, posterior)
+
+    return posteriors
+
+
+def fit_models(rs, locations, model, inference_method, hier, path, save, pivot=None, jobs=1, batch=False, warm_start=False, cache_spec=None, posterior_format="json"):
     multi_posterior = ef.MultiPosterior()
 
     if hier:
         # Subset data to locations of interest
         raw_seq = rs[rs.location.isin(locations)]
+        warm_start_path = f"{path}/warm_start/hierarchical.json" if warm_start else None
+        key = None
+        if cache_spec is not None:
+            # Warm started fits also depend on the warm start
+            key = fit_cache_key(raw_seq, {**cache_spec, "warm_start": file_hash(warm_start_path)})
         data = ef.HierFrequencies(raw_seq=raw_seq, pivot=pivot, group="location")
 
-        # Fit model
-        posterior = inference_method.fit(model, data, name="hierarchical")
+        posterior = load_cached_fit(key, model, data, "hierarchical") if key else None
+
+        if posterior is None:
+            # Load warm start from previous fit
+            init_values = load_warm_start(warm_start_path, model, data) if warm_start_path else None
 
-        # Forecast frequencies
-        n_days_to_present = (pd.to_datetime(date.today()) - data.dates[-1]).days
-        n_days_to_forecast = n_days_to_present + model.forecast_L
-        model.forecast_frequencies(posterior.samples, forecast_L=n_days_to_forecast)
+            # Fit model
+            posterior = inference_method.fit(model, data, name="hierarchical", init_values=init_values)
+
+            # Forecast frequencies
+            forecast_frequencies(model, posterior)
+
+            if key:
+                cache_posterior(key, posterior)
 
         multi_posterior.add_posterior(posterior=posterior)
 
         if save:
-            posterior.save_posterior(f"{path}/models/hierarchical.json")
+            save_posterior(posterior, posterior_path(path, "hierarchical", posterior_format))
+
+        # Save warm start for the next run
+        if warm_start:
+            save_warm_start(warm_start_path, posterior, model)
     else:
+        # Each location is fit from its own random state derived from the seed
+        rng_key = random.PRNGKey(0)
+
+        tasks = []
+        keys = {}
+        posteriors = {}
         for location in locations:
             # Subset to data of interest
             raw_seq = rs[rs.location == location].copy()
@@ -169,37 +304,59 @@ def fit_models(rs, locations, model, inference_method, hier, path, save, pivot=N
                 print(f"Location {location} not in data")
                 continue
 
-            data = ef.VariantFrequencies(raw_seq=raw_seq, pivot=pivot)
-
-            # Fit model
-            posterior = inference_method.fit(model, data, name=location)
+            # Only locations without a cached fit to the same data and warm
+            # start are fit
+            warm_start_path = f"{path}/warm_start/{location}.json" if warm_start else None
+            posteriors[location] = None
+            if cache_spec is not None:
+                keys[location] = fit_cache_key(raw_seq, {**cache_spec, "warm_start": file_hash(warm_start_path)})
+                data = ef.VariantFrequencies(raw_seq=raw_seq, pivot=pivot)
+                posteriors[location] = load_cached_fit(keys[location], model, data, location)
+                if posteriors[location] is not None:
+                    continue
+
+            tasks.append((location, raw_seq, model, inference_method, pivot, warm_start_path, location_rng_key(rng_key, location)))
+
+        if batch:
+            if warm_start:
+                raise ValueError("Warm starts are not supported when fitting locations in batch.")
+            # Locations are fit as one vectorized program
+            fitted = fit_batched(tasks, model, inference_method, pivot)
+        else:
+            # Locations are independent, so they can be fit in parallel
+            fitted = fit_locations(fit_location, tasks, jobs)
 
-            # Forecast frequencies
-            n_days_to_present = (pd.to_datetime(date.today()) - data.dates[-1]).days
-            n_days_to_forecast = n_days_to_present + model.forecast_L
-            model.forecast_frequencies(posterior.samples, forecast_L=n_days_to_forecast)
+        for (location, *_), posterior in zip(tasks, fitted):
+            posteriors[location] = posterior
+            if location in keys:
+                cache_posterior(keys[location], posterior)
 
+        for location, posterior in posteriors.items():
             # Add posterior to group
             multi_posterior.add_posterior(posterior=posterior)
 
             # if save, save
             if save:
-                posterior.save_posterior(f"{path}/models/{location}.json")
+                save_posterior(posterior, posterior_path(path, location, posterior_format))
+
+            # Save warm start for the next run
+            if warm_start:
+                save_warm_start(f"{path}/warm_start/{location}.json", posterior, model)
 
     return multi_posterior
 
 
-def load_models(rs, locations, model, path=None):
+def load_models(rs, locations, model, path=None, pivot=None, posterior_format="json"):
     multi_posterior = ef.MultiPosterior()
 
     for location in locations:
         # Subset to data of interest
         raw_seq = rs[rs.location == location].copy()
-        data = ef.VariantFrequencies(raw_seq=raw_seq)
+        data = ef.VariantFrequencies(raw_seq=raw_seq, pivot=pivot)
 
         # Load samples
         posterior = ef.PosteriorHandler(data=data, name=location)
-        posterior.load_posterior(f"{path}/models/{location}.json")
+        load_posterior(posterior, posterior_path(path, location, posterior_format))
 
         # Add posterior to group
         multi_posterior.add_posterior(posterior=posterior)
@@ -221,62 +378,131 @@ def make_model_directories(path):
     make_path_if_absent(path + "/models")
 
 
-def make_raw_freq_tidy(data, location):
-    # Unpack HierFrequencies
-    variants = data.var_names
-    date_map = data.date_to_index
+def moving_sum(x, window):
+    """
+    Return the moving sums of the rows of *x* over a *window* of rows, the
+    same as `np.convolve(x[:, i], np.ones(window), mode='same')` for each
+    column *i*, but computed from cumulative sums. Sums over windows that
+    include a NaN are NaN.
+    """
+    n = x.shape[0]
 
-    # Calculate daily raw frequencies
-    daily_raw_freq = data.seq_counts / data.seq_counts.sum(axis=1)[:, None]
+    # Rows of each window, with the alignment of np.convolve's "same" mode
+    offset = (n + window - 1 - max(n, window)) // 2
+    stop = np.arange(n) + offset + 1
+    start = np.clip(stop - window, 0, n)
+    stop = np.clip(stop, 0, n)
+
+    zeros = np.zeros((1, *x.shape[1:]))
+    sums = np.concatenate([zeros, np.cumsum(np.nan_to_num(x), axis=0)])
+    nans = np.concatenate([zeros, np.cumsum(np.isnan(x), axis=0)])
+    return np.where(nans[stop] > nans[start], np.nan, sums[stop] - sums[start])
+
+
+def tidy_values(values):
+    """
+    Return the *values* rounded to 3 decimals as nested lists, with None for
+    NaN values.
+    """
+    return np.where(np.isnan(values), None, np.around(values, decimals=3)).tolist()
 
-    # Calculate the 7-day moving sum for each of the clades
-    kernel = np.ones(7)  # 7-day window
-    numerator = np.apply_along_axis(lambda x: np.convolve(x, kernel, mode='same'), axis=0, arr=data.seq_counts)
 
-    # Calculate the 7-day moving sum for the total count across all clades (Denominator)
+def make_raw_freqs(data):
+    # Calculate daily raw frequencies
     total_counts = data.seq_counts.sum(axis=1)
-    denominator = np.convolve(total_counts, kernel, mode='same')
+    daily_raw_freq = data.seq_counts / total_counts[:, None]
 
-    # Calculate the 7-day smoothed daily frequency
-    weekly_raw_freq = numerator / denominator[:, None]
+    # Calculate the 7-day smoothed daily frequency from the 7-day moving sums
+    # of each of the clades and of the total count across all clades
+    weekly_raw_freq = moving_sum(data.seq_counts, 7) / moving_sum(total_counts, 7)[:, None]
 
-    # Create metadata
-    metadata = {
+    return daily_raw_freq, weekly_raw_freq
+
+
+def make_raw_freq_metadata(data, location):
+    return {
         "dates": data.dates,
         "variants": data.var_names,
         "sites": ["daily_raw_freq", "weekly_raw_freq"],
         "location": [location]
     }
 
+
+def make_raw_freq_tidy(data, location):
+    # Unpack HierFrequencies
+    variants = data.var_names
+    date_map = data.date_to_index
+
+    daily_raw_freq, weekly_raw_freq = make_raw_freqs(data)
+
+    # Create metadata
+    metadata = make_raw_freq_metadata(data, location)
+
+    # Values by variant and date
+    dates = [day.strftime("%Y-%m-%d") for day in date_map]
+    date_indices = list(date_map.values())
+    daily_values = tidy_values(daily_raw_freq[date_indices].T)
+    weekly_values = tidy_values(weekly_raw_freq[date_indices].T)
+
     # Tidy entries
-    entries = []
-    for v, variant in enumerate(variants):
-        for day, d in date_map.items():
-            entries.append({
-                "location": location,
-                "site": "daily_raw_freq",
-                "variant": variant,
-                "date": day.strftime("%Y-%m-%d"),
-                "value": (
-                    None
-                    if np.isnan(daily_raw_freq[d, v])
-                    else np.around(daily_raw_freq[d, v], decimals=3))
-            })
-            entries.append({
-                "location": location,
-                "site": "weekly_raw_freq",
-                "variant": variant,
-                "date": day.strftime("%Y-%m-%d"),
-                "value": (
-                    None
-                    if np.isnan(weekly_raw_freq[d, v])
-                    else np.around(weekly_raw_freq[d, v], decimals=3))
-            })
+    entries = [
+        {
+            "location": location,
+            "site": site,
+            "variant": variant,
+            "date": day,
+            "value": values[v][d]
+        }
+        for v, variant in enumerate(variants)
+        for d, day in enumerate(dates)
+        for site, values in (("daily_raw_freq", daily_values), ("weekly_raw_freq", weekly_values))
+    ]
 
     return {"metadata": metadata, "data": entries}
 
 
-def export_results(multi_posterior, ps, path, data_name, hier, pivot, ga_inclusion_threshold, variant_location_counts):
+def make_raw_freq_table(data, location):
+    date_map = data.date_to_index
+    date_indices = list(date_map.values())
+
+    # Raw frequencies by variant and date, without probability levels
+    tables = [
+        make_table_data(location, site, data.var_names, list(date_map), [None], np.around(raw_freq[date_indices].T[..., None], decimals=3))
+        for site, raw_freq in zip(["daily_raw_freq", "weekly_raw_freq"], make_raw_freqs(data))
+    ]
+
+    # Interleave the rows of the sites by variant and date like the results JSON
+    n_rows = len(tables[0])
+    order = np.argsort(np.concatenate([np.arange(n_rows) * 2, np.arange(n_rows) * 2 + 1]))
+    rows = pd.concat(tables, ignore_index=True).iloc[order].reset_index(drop=True)
+
+    return {"metadata": make_raw_freq_metadata(data, location), "data": rows}
+
+
+def ga_excluded_variants(location, variants, variant_location_counts, ga_inclusion_threshold):
+    # Variants with too few sequences in the location for its growth advantage estimates
+    return {
+        variant
+        for variant in variants
+        if variant_location_counts.get((location, variant), 0) < ga_inclusion_threshold
+    }
+
+
+def get_ga_tidy(posterior, ps, location, excluded_variants):
+    # Drop the growth advantage samples of excluded variants, so their
+    # estimates are never computed or tidied
+    data = posterior.data
+    ga = np.asarray(posterior.samples["ga"])
+    kept = [v for v, variant in enumerate(data.var_names[:ga.shape[-1]]) if variant not in excluded_variants]
+    kept_data = SimpleNamespace(
+        dates=data.dates,
+        var_names=[data.var_names[v] for v in kept],
+        date_to_index=data.date_to_index,
+    )
+    return ef.posterior.get_sites_variants_tidy({"ga": ga[..., kept]}, kept_data, ["ga"], [False], [False], ps, location)
+
+
+def export_results(multi_posterior, ps, path, data_name, hier, pivot, ga_inclusion_threshold, variant_location_counts, export_json=True, export_parquet=False):
     EXPORT_SITES = ["freq", "ga", "freq_forecast"]
     EXPORT_DATED = [True, False, True]
     EXPORT_FORECASTS = [False, False, True]
@@ -313,81 +539,110 @@ def export_results(multi_posterior, ps, path, data_name, hier, pivot, ga_inclusi
                 name="hierarchical")
         )
 
-    # Combine jsons from multiple model runs
+    # Combine results from multiple model runs as tidy entries for the JSON
+    # and as columnar tables for Parquet
     results = []
+    tables = []
     for location, posterior in multi_posterior.locator.items():
         if location == "hierarchical":
-            results.append(
-                ef.posterior.get_sites_variants_tidy(
-                    posterior.samples,
-                    posterior.data,
-                    ["ga"],
-                    [False],
-                    [False],
-                    ps,
-                    location
+            if export_json:
+                results.append(
+                    ef.posterior.get_sites_variants_tidy(
+                        posterior.samples,
+                        posterior.data,
+                        ["ga"],
+                        [False],
+                        [False],
+                        ps,
+                        location
+                    )
+                )
+            if export_parquet:
+                tables.append(
+                    get_sites_variants_table(posterior.samples, posterior.data, ["ga"], [False], [False], ps, location)
                 )
-            )
         else:
-            site_variants_data = ef.posterior.get_sites_variants_tidy(
-                posterior.samples,
-                posterior.data,
-                EXPORT_SITES,
-                EXPORT_DATED,
-                EXPORT_FORECASTS,
-                ps,
-                location,
+            # Filter out ga values of variants with too few sequences
+            excluded_variants = ga_excluded_variants(
+                location, posterior.data.var_names, variant_location_counts, ga_inclusion_threshold
             )
 
-            # Apply filtering on ga values
-            filtered_data = []
-            for entry in site_variants_data["data"]:
-                if entry["site"] == "ga":
-                    variant = entry["variant"]
-
-                    # Lookup the total sequence count for this (location, variant)
-                    variant_count = variant_location_counts.get((location, variant), 0)
-
-                    # print(f"Location: {location}, Variant: {variant}, Count: {variant_count}")
-
-                    if variant_count < ga_inclusion_threshold:
-                        continue  # Skip this entry
-                filtered_data.append(entry)
-
-            site_variants_data["data"] = filtered_data
-            results.append(site_variants_data)
+            if export_json:
+                # Sites are tidied one by one in the same order as a single
+                # tidy of all sites, so only the growth advantages are filtered
+                for site, dated, forecast in zip(EXPORT_SITES, EXPORT_DATED, EXPORT_FORECASTS):
+                    if site == "ga":
+                        results.append(get_ga_tidy(posterior, ps, location, excluded_variants))
+                    else:
+                        results.append(
+                            ef.posterior.get_sites_variants_tidy(
+                                posterior.samples,
+                                posterior.data,
+                                [site],
+                                [dated],
+                                [forecast],
+                                ps,
+                                location,
+                            )
+                        )
+
+            if export_parquet:
+                table = get_sites_variants_table(
+                    posterior.samples, posterior.data, EXPORT_SITES, EXPORT_DATED, EXPORT_FORECASTS, ps, location
+                )
+                data = table["data"]
+                table["data"] = data[~((data["site"] == "ga") & data["variant"].isin(excluded_variants))]
+                tables.append(table)
 
     # Add raw frequencies
     for location, posterior in multi_posterior.locator.items():
         if location != "hierarchical":
-            results.append(
-                make_raw_freq_tidy(posterior.data, location)
-            )
-
-    results = ef.posterior.combine_sites_tidy(results)
-    results["metadata"]["updated"] = pd.to_datetime(date.today())
-
-    # Add hard-coded pivot data if a pivot is provided
-    if pivot:
-        results["metadata"]["pivot"] = pivot
-        # Mirroring the ps keys generated within evofr
-        # <https://github.com/blab/evofr/blob/e883784dc397805c50bbcd56b083f4f232b03e17/evofr/posterior/posterior_helpers.py#L296C5-L299C54>
-        ps_keys = ["median"]
-        for p in ps:
-            ps_keys.append(f"HDI_{round(p * 100)}_upper")
-            ps_keys.append(f"HDI_{round(p * 100)}_lower")
-
-        for location, _ in multi_posterior.locator.items():
-            for ps_key in ps_keys:
-                results["data"].append({
-                    "location": location,
-                    "site": "ga",
-                    "variant": pivot,
-                    "value": 1.0,
-                    "ps": ps_key
+            if export_json:
+                results.append(make_raw_freq_tidy(posterior.data, location))
+            if export_parquet:
+                tables.append(make_raw_freq_table(posterior.data, location))
+
+    # Mirroring the ps keys generated within evofr
+    # <https://github.com/blab/evofr/blob/e883784dc397805c50bbcd56b083f4f232b03e17/evofr/posterior/posterior_helpers.py#L296C5-L299C54>
+    ps_keys = ["median"]
+    for p in ps:
+        ps_keys.append(f"HDI_{round(p * 100)}_upper")
+        ps_keys.append(f"HDI_{round(p * 100)}_lower")
+
+    if export_json:
+        results = ef.posterior.combine_sites_tidy(results)
+        results["metadata"]["updated"] = pd.to_datetime(date.today())
+
+        # Add hard-coded pivot data if a pivot is provided
+        if pivot:
+            results["metadata"]["pivot"] = pivot
+            for location, _ in multi_posterior.locator.items():
+                for ps_key in ps_keys:
+                    results["data"].append({
+                        "location": location,
+                        "site": "ga",
+                        "variant": pivot,
+                        "value": 1.0,
+                        "ps": ps_key
+                    })
+
+        ef.save_json(results, path=f"{path}/{data_name}_results.json")
+
+    if export_parquet:
+        # Add hard-coded pivot data if a pivot is provided
+        if pivot:
+            for location, _ in multi_posterior.locator.items():
+                tables.append({
+                    "metadata": {},
+                    "data": make_table_data(location, "ga", [pivot], [None], ps_keys, np.ones((1, 1, len(ps_keys)))),
                 })
 
-    ef.save_json(results, path=f"{path}/{data_name}_results.json")
+        tables = combine_tables(tables)
+        tables["metadata"]["updated"] = pd.to_datetime(date.today())
+        if pivot:
+            tables["metadata"]["pivot"] = pivot
+
+        write_results_table(tables, f"{path}/{data_name}_results.parquet")
 
 def nonnegative_int(value):
     """
@@ -436,8 +691,40 @@ if __name__ == "__main__":
         + "even if there isn't data for a particular combination."
     )
 
+    parser.add_argument(
+        "--jobs", type=nonnegative_int, default=1,
+        help="Number of processes to fit the models of locations in parallel. "
+        + "Each process uses an equal share of the available cores. "
+        + "Has no effect on hierarchical models. Default is 1."
+    )
+
+    parser.add_argument(
+        "--batch", action="store_true", default=False,
+        help="Fit the non-hierarchical models of all locations as one vectorized program, "
+        + "padding the data of each location to the same dates and variants. "
+        + "NUTS samples all locations in lockstep, so each sample takes as long as the slowest location. "
+        + "Overrides --jobs and cannot be used with --warm-start. Has no effect on hierarchical models."
+    )
+
+    parser.add_argument(
+        "--warm-start", action="store_true", default=False,
+        help="Start fits from the posteriors saved by the previous run in the export path, "
+        + "with inference.warm_start_iters optimization steps and inference.warm_start_num_warmup "
+        + "NUTS warmup samples, and save the posteriors to warm start the next run. "
+        + "Fits without a saved posterior or with a different pivot are started from scratch."
+    )
+
+    parser.add_argument(
+        "--posterior-format", choices=list(POSTERIOR_EXTENSIONS),
+        help="Format of the posteriors saved to and loaded from the models directory of the export path, "
+        + "either JSON or a directory of memory-mappable arrays per site. Overrides settings.posterior_format in config."
+    )
+
     args = parser.parse_args()
 
+    if args.batch and args.warm_start:
+        parser.error("--batch cannot be used with --warm-start.")
+
     # Load configuration, data, and create model
     config = MLRConfig(args.config)
     print(f"Config loaded: {config.path}")
@@ -460,9 +747,12 @@ if __name__ == "__main__":
     inference_method = config.load_optim()
     print("Inference method defined.")
 
-    fit, save, load, export_json, export_path = config.load_settings(
+    fit, save, load, export_json, export_parquet, export_path = config.load_settings(
         args.export_path
     )
+    posterior_format = args.posterior_format or parse_with_default(
+        config.config["settings"], "posterior_format", dflt="json"
+    )
     print("Settings loaded")
 
     # Find export path
@@ -478,6 +768,17 @@ if __name__ == "__main__":
         pivot = args.pivot
     print("pivot", pivot)
 
+    # Fits are cached by their data and these options, if the cache is enabled,
+    # so the data of fits are only hashed when the cache is enabled
+    cache_spec = None
+    if fit_cache_enabled():
+        cache_spec = {
+            "model": config.config["model"],
+            "inference": config.config["inference"],
+            "hierarchical": hier,
+            "pivot": pivot,
+        }
+
     # Fit or load model results
     if fit:
         print("Fitting model")
@@ -489,7 +790,12 @@ if __name__ == "__main__":
             hier,
             export_path,
             save,
-            pivot=pivot
+            pivot=pivot,
+            jobs=args.jobs,
+            batch=args.batch,
+            warm_start=args.warm_start,
+            cache_spec=cache_spec,
+            posterior_format=posterior_format
         )
     elif load:
         print("Loading results")
@@ -498,16 +804,21 @@ if __name__ == "__main__":
             locations,
             mlr_model,
             export_path,
+            pivot=pivot,
+            posterior_format=posterior_format
         )
     else:
         print("No models fit or results loaded.")
         multi_posterior = ef.MultiPosterior()
 
     # Export results
-    if export_json and (fit or load):
-        print(f"Exporting results as .json at {export_path}")
+    if (export_json or export_parquet) and (fit or load):
+        print(f"Exporting results at {export_path}")
         ps = parse_with_default(
             config.config["settings"], "ps", dflt=[0.5, 0.8, 0.95]
         )
         data_name = args.data_name or config.config["data"]["name"]
-        export_results(multi_posterior, ps, export_path, data_name, hier, pivot, args.location_ga_inclusion_threshold, variant_location_counts)
+        export_results(
+            multi_posterior, ps, export_path, data_name, hier, pivot, args.location_ga_inclusion_threshold, variant_location_counts,
+            export_json=export_json, export_parquet=export_parquet
+        )
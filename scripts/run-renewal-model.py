@@ -6,6 +6,11 @@ import pandas as pd
 import os
 import yaml
 import evofr as ef
+from jax import random
+from count_tables import is_parquet, read_counts
+from model_jobs import fit_locations, location_rng_key
+from posterior_arrays import POSTERIOR_EXTENSIONS, load_posterior, posterior_path, save_posterior
+from results_tables import combine_tables, get_sites_variants_table, write_results_table
 
 
 def parse_with_default(cf, var, dflt):
@@ -118,27 +123,41 @@ class NUTS_from_MAP:
         self.iters = iters
         self.lr = lr
 
-    def fit(self, model, data, name=None):
+    def fit(self, model, data, name=None, rng_key=None):
         init_strat, _ = ef.init_to_MAP(model, data, iters=30_000, lr=self.lr)
         inference_method = ef.InferNUTS(
             num_warmup=self.num_warmup,
             num_samples=self.num_samples,
-            init_strategy=init_strat
+            init_strategy=init_strat,
+            rng_key=rng_key,
         )
         return inference_method.fit(model, data, name=name)
 
 
+class SVI_per_fit:
+    """
+    Creates a new SVI inference method for every fit, so each location is fit
+    from its own random state and the method can be sent to worker processes.
+    """
+    def __init__(self, infer_class, **kwargs):
+        self.infer_class = infer_class
+        self.kwargs = kwargs
+
+    def fit(self, model, data, name=None, rng_key=None):
+        return self.infer_class(**self.kwargs, rng_key=rng_key).fit(model, data, name=name)
+
+
 def parse_inference_method(method_name, lr, iters, num_warmup, num_samples):
     if method_name == "FullRank":
-        method = ef.InferFullRank(lr=lr, iters=iters, num_samples=num_samples)
+        method = SVI_per_fit(ef.InferFullRank, lr=lr, iters=iters, num_samples=num_samples)
     elif method_name == "MAP":
-        method = ef.InferMAP(lr=lr, iters=iters)
+        method = SVI_per_fit(ef.InferMAP, lr=lr, iters=iters)
     elif method_name == "NUTS":
         method = NUTS_from_MAP(
             num_warmup=num_warmup, num_samples=num_samples, iters=iters, lr=lr
         )
     else:  # Default is full rank
-        method = ef.InferFullRank(lr=lr, iters=iters, num_samples=num_samples)
+        method = SVI_per_fit(ef.InferFullRank, lr=lr, iters=iters, num_samples=num_samples)
     return method
 
 
@@ -157,15 +176,15 @@ class RenewalConfig:
 
         # Load case data
         case_path = override_case_path or data_cf["case_path"]
-        if case_path.endswith(".tsv"):
-            raw_cases = pd.read_csv(case_path, sep="\t")
+        if is_parquet(case_path) or case_path.endswith(".tsv"):
+            raw_cases = read_counts(case_path)
         else:
             raw_cases = pd.read_csv(case_path)
 
         # Load sequence count data
         seq_path = override_seq_path or data_cf["seq_path"]
-        if seq_path.endswith(".tsv"):
-            raw_seq = pd.read_csv(seq_path, sep="\t")
+        if is_parquet(seq_path) or seq_path.endswith(".tsv"):
+            raw_seq = read_counts(seq_path)
         else:
             raw_seq = pd.read_csv(seq_path)
 
@@ -231,8 +250,11 @@ class RenewalConfig:
         export_json = parse_with_default(
             settings_cf, "export_json", dflt=False
         )
+        export_parquet = parse_with_default(
+            settings_cf, "export_parquet", dflt=False
+        )
         export_path = override_export_path or parse_with_default(settings_cf, "export_path", dflt=None)
-        return fit, save, load, export_json, export_path
+        return fit, save, load, export_json, export_parquet, export_path
 
 
 def check_generation_times(rs, model):
@@ -244,11 +266,27 @@ def check_generation_times(rs, model):
     return None
 
 
-def fit_models(rc, rs, locations, model, inference_method, path, save, pivot=None):
+def fit_location(location, raw_cases, raw_seq, model, inference_method, pivot=None, rng_key=None):
+    # Define data object
+    data = ef.CaseFrequencyData(
+        raw_cases=raw_cases,
+        raw_seq=raw_seq,
+        pivot=pivot
+    )
+
+    # Fit model
+    return inference_method.fit(model, data, name=location, rng_key=rng_key)
+
+
+def fit_models(rc, rs, locations, model, inference_method, path, save, pivot=None, jobs=1, posterior_format="json"):
     multi_posterior = ef.MultiPosterior()
 
     check_generation_times(rs, model)
 
+    # Each location is fit from its own random state derived from the seed
+    rng_key = random.PRNGKey(0)
+
+    tasks = []
     for location in locations:
         # Subset to data of interest
         raw_cases = rc[rc.location == location].copy()
@@ -259,38 +297,32 @@ def fit_models(rc, rs, locations, model, inference_method, path, save, pivot=Non
             print(f'Location {location} not in data')
             continue
 
-        # Define data object
-        data = ef.CaseFrequencyData(
-            raw_cases=raw_cases,
-            raw_seq=raw_seq,
-            pivot=pivot
-        )
-
-        # Fit model
-        posterior = inference_method.fit(model, data, name=location)
+        tasks.append((location, raw_cases, raw_seq, model, inference_method, pivot, location_rng_key(rng_key, location)))
 
+    # Locations are independent, so they can be fit in parallel
+    for (location, *_), posterior in zip(tasks, fit_locations(fit_location, tasks, jobs)):
         # Add posterior to group
         multi_posterior.add_posterior(posterior=posterior)
 
         # if save, save
         if save:
-            posterior.save_posterior(f"{path}/models/{location}.json")
+            save_posterior(posterior, posterior_path(path, location, posterior_format))
 
     return multi_posterior
 
 
-def load_models(rc, rs, locations, model, path=None):
+def load_models(rc, rs, locations, model, path=None, pivot=None, posterior_format="json"):
     multi_posterior = ef.MultiPosterior()
 
     for location in locations:
         # Subset to data of interest
         raw_cases = rc[rc.location == location].copy()
         raw_seq = rs[rs.location == location].copy()
-        data = ef.CaseFrequencyData(raw_cases=raw_cases, raw_seq=raw_seq)
+        data = ef.CaseFrequencyData(raw_cases=raw_cases, raw_seq=raw_seq, pivot=pivot)
 
         # Load samples
         posterior = ef.PosteriorHandler(data=data, name=location)
-        posterior.load_posterior(f"{path}/models/{location}.json")
+        load_posterior(posterior, posterior_path(path, location, posterior_format))
 
         # Add posterior to group
         multi_posterior.add_posterior(posterior=posterior)
@@ -312,7 +344,7 @@ def make_model_directories(path):
     make_path_if_absent(path + "/models")
 
 
-def export_results(multi_posterior, ps, path, data_name):
+def export_results(multi_posterior, ps, path, data_name, export_json=True, export_parquet=False):
     EXPORT_SITES = ["freq", "freq_forecast", "R", "I_smooth", "ga"]
     EXPORT_DATED = [True, True, True, True, True]
     EXPORT_FORECASTS = [False, True, False, False, False]
@@ -321,20 +353,48 @@ def export_results(multi_posterior, ps, path, data_name):
     make_model_directories(path)
 
     # Combine jsons from multiple model runs
-    results = []
-    for location, posterior in multi_posterior.locator.items():
-        results.append(
-            ef.posterior.get_sites_variants_tidy(
-                posterior.samples,
-                posterior.data,
-                EXPORT_SITES,
-                EXPORT_DATED,
-                EXPORT_FORECASTS,
-                ps,
-                location
-        ))
-    results = ef.posterior.combine_sites_tidy(results)
-    ef.save_json(results, path=f"{path}/{data_name}_results.json")
+    if export_json:
+        results = []
+        for location, posterior in multi_posterior.locator.items():
+            results.append(
+                ef.posterior.get_sites_variants_tidy(
+                    posterior.samples,
+                    posterior.data,
+                    EXPORT_SITES,
+                    EXPORT_DATED,
+                    EXPORT_FORECASTS,
+                    ps,
+                    location
+            ))
+        results = ef.posterior.combine_sites_tidy(results)
+        ef.save_json(results, path=f"{path}/{data_name}_results.json")
+
+    # Combine columnar tables from multiple model runs
+    if export_parquet:
+        tables = []
+        for location, posterior in multi_posterior.locator.items():
+            tables.append(
+                get_sites_variants_table(
+                    posterior.samples,
+                    posterior.data,
+                    EXPORT_SITES,
+                    EXPORT_DATED,
+                    EXPORT_FORECASTS,
+                    ps,
+                    location
+            ))
+        write_results_table(combine_tables(tables), f"{path}/{data_name}_results.parquet")
+
+
+def nonnegative_int(value):
+    """
+    Custom argparse type function to verify only
+    positive integers are provided as arguments
+    """
+    int_value = int(value)
+    if int_value <= 0:
+        raise argparse.ArgumentTypeError(f"{int_value} is not a positive integer.")
+    return int_value
 
 
 if __name__ == "__main__":
@@ -347,6 +407,8 @@ if __name__ == "__main__":
     parser.add_argument("--seq-path", help="File path to sequence data. Overrides data.seq_path in config.")
     parser.add_argument("--export-path", help="Path to export directory. Overrides settings.export_path in config.")
     parser.add_argument("--data-name", help="Name of the data set to include in the results filename as <data_name>_results.json. Overrides data.name in config.")
+    parser.add_argument("--jobs", type=nonnegative_int, default=1, help="Number of processes to fit the models of locations in parallel. Each process uses an equal share of the available cores.")
+    parser.add_argument("--posterior-format", choices=list(POSTERIOR_EXTENSIONS), help="Format of the posteriors saved to and loaded from the models directory of the export path, either JSON or a directory of memory-mappable arrays per site. Overrides settings.posterior_format in config.")
     args = parser.parse_args()
 
     # Load configuration, data, and create model
@@ -362,7 +424,8 @@ if __name__ == "__main__":
     inference_method = config.load_optim()
     print("Inference method defined.")
 
-    fit, save, load, export_json, export_path = config.load_settings(args.export_path)
+    fit, save, load, export_json, export_parquet, export_path = config.load_settings(args.export_path)
+    posterior_format = args.posterior_format or parse_with_default(config.config["settings"], "posterior_format", dflt="json")
     print("Settings loaded")
 
     # Find export path
@@ -380,7 +443,9 @@ if __name__ == "__main__":
             inference_method,
             export_path,
             save,
-            pivot=config.config["model"]["pivot"]
+            pivot=config.config["model"]["pivot"],
+            jobs=args.jobs,
+            posterior_format=posterior_format
         )
     elif load:
         print("Loading results")
@@ -390,16 +455,18 @@ if __name__ == "__main__":
             locations,
             renewal_model,
             export_path,
+            pivot=config.config["model"]["pivot"],
+            posterior_format=posterior_format
         )
     else:
         print("No models fit or results loaded.")
         multi_posterior = ef.MultiPosterior()
 
     # Export results
-    if export_json and (fit or load):
-        print(f"Exporting results as .json at {export_path}")
+    if (export_json or export_parquet) and (fit or load):
+        print(f"Exporting results at {export_path}")
         ps = parse_with_default(
             config.config["settings"], "ps", dflt=[0.5, 0.8, 0.95]
         )
         data_name = args.data_name or config.config["data"]["name"]
-        export_results(multi_posterior, ps[1:], export_path, data_name)
+        export_results(multi_posterior, ps[1:], export_path, data_name, export_json=export_json, export_parquet=export_parquet)
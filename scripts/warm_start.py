@@ -0,0 +1,178 @@
+"""
+Warm start MLR model fits from the posterior of the previous run.
+
+After each fit, the posterior median of the MLR coefficients is saved with the
+variants, locations and first date of the fit's data. The next run aligns
+these coefficients to its own data and uses them as the initial values of the
+model's latent sites:
+
+    * Intercepts are shifted to the new first date using the slopes.
+    * Variants and locations that are no longer in the data are dropped.
+    * New variants and locations start from zero coefficients, and new
+      locations of hierarchical models start from the pooled slopes.
+
+Coefficients are relative to the pivot variant, so a fit is not warm started
+if its pivot has changed since the previous run.
+
+The latent sites of hierarchical models are affine reparameterizations of the
+coefficients. Their transforms are read from the model by tracing it, so the
+initial values follow the priors of the installed evofr version.
+
+SVI guides with a scale are also started narrower than their default scale, as
+a guide as wide as the default scale of 0.1 pulls the slopes away from the
+initial values before the guide has narrowed to the posterior.
+"""
+import inspect
+import json
+import os
+from functools import partial
+
+import evofr as ef
+import jax.numpy as jnp
+import numpy as np
+from numpyro import handlers
+from numpyro.infer import init_to_value
+from numpyro.infer.autoguide import AutoDelta
+
+
+# Initial scale of warm started SVI guides, between the posterior scales of the
+# MLR slopes and intercepts
+GUIDE_INIT_SCALE = 0.01
+
+
+def save_warm_start(path, posterior, model):
+    """
+    Save the posterior median of the MLR coefficients of the *posterior* to
+    *path* to warm start the next fit.
+    """
+    data = posterior.data
+    samples = posterior.samples
+    warm_start = {
+        "variants": list(data.var_names),
+        "first_date": data.dates[0].strftime("%Y-%m-%d"),
+        "beta": np.median(np.asarray(samples["beta"]), axis=0).tolist(),
+    }
+    if isinstance(model, ef.HierMLR):
+        warm_start["groups"] = list(data.names)
+        warm_start["beta_loc"] = np.median(np.asarray(samples["beta_loc"]), axis=0).tolist()
+        warm_start["beta_scale"] = float(np.median(np.asarray(samples["beta_scale"])))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(warm_start, fh)
+
+
+def _align(values, old_names, new_names, axis, fill=0.0):
+    """
+    Reorder *values* along *axis* from *old_names* to *new_names*, filling
+    values of new names with *fill*.
+    """
+    old_index = {name: i for i, name in enumerate(old_names)}
+    shape = list(values.shape)
+    shape[axis] = len(new_names)
+    aligned = np.broadcast_to(np.asarray(fill, dtype=float), shape).copy()
+    for i, name in enumerate(new_names):
+        if name in old_index:
+            aligned.swapaxes(0, axis)[i] = values.swapaxes(0, axis)[old_index[name]]
+    return aligned
+
+
+def _invert_reparam(model, data, values):
+    """
+    Return the values of the base sites of the reparameterized sites of
+    *model* fit to *data* that give the *values* of the sites.
+
+    Each site is an affine transform of its base site, so its transform is
+    read from the model by tracing it with base values of zero and one. Sites
+    are inverted in the order of *values*, as the transforms of later sites
+    may depend on earlier sites.
+    """
+    input = data.make_data_dict()
+    model.augment_data(input)
+
+    base_values = {}
+
+    def site_value(site, base_value):
+        model_fn = handlers.substitute(model.model_fn, data={**base_values, f"{site}_base": base_value})
+        return handlers.trace(handlers.seed(model_fn, 0)).get_trace(**input)[site]["value"]
+
+    for site, value in values.items():
+        value = jnp.asarray(value)
+        loc = site_value(site, jnp.zeros_like(value))
+        scale = site_value(site, jnp.ones_like(value)) - loc
+        base_values[f"{site}_base"] = (value - loc) / scale
+
+    return base_values
+
+
+def load_warm_start(path, model, data):
+    """
+    Return initial values for the latent sites of *model* fit to *data* from
+    the warm start saved at *path*, or None if there is no usable warm start.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as fh:
+        warm_start = json.load(fh)
+
+    if warm_start["variants"][-1] != data.var_names[-1]:
+        print(f"Not warm starting from {path!r}: the pivot has changed from {warm_start['variants'][-1]!r}")
+        return None
+
+    # Coefficients of the non-pivot variants, as the pivot is fixed to zero
+    old_variants = warm_start["variants"][:-1]
+    new_variants = list(data.var_names[:-1])
+    beta = _align(np.asarray(warm_start["beta"])[:, :-1], old_variants, new_variants, axis=1)
+
+    # Shift intercepts from the previous first date to the new first date
+    shift = (data.dates[0] - np.datetime64(warm_start["first_date"])).days
+    beta[0] += beta[1] * shift
+
+    if isinstance(model, ef.HierMLR):
+        beta_loc = _align(np.asarray(warm_start["beta_loc"]), old_variants, new_variants, axis=0)
+        beta_scale = warm_start["beta_scale"]
+
+        # Align locations, starting new locations from the pooled slopes
+        alpha = _align(beta[0], warm_start["groups"], data.names, axis=1)
+        raw_beta = _align(beta[1], warm_start["groups"], data.names, axis=1, fill=np.nan)
+        raw_beta = np.where(np.isnan(raw_beta), beta_loc, raw_beta)
+
+        # The slopes of each location are drawn around the pooled slopes,
+        # so the pooled sites come first
+        return _invert_reparam(model, data, {
+            "beta_scale": beta_scale,
+            "beta_loc": beta_loc,
+            "alpha": alpha,
+            "raw_beta": raw_beta,
+        })
+
+    return {"raw_beta": jnp.asarray(beta)}
+
+
+def warm_start_guide(guide_fn, init_values):
+    """
+    Return the SVI *guide_fn* started from *init_values*.
+    """
+    guide_kwargs = {"init_loc_fn": init_to_value(values=init_values)}
+    if "init_scale" in inspect.signature(guide_fn).parameters:
+        guide_kwargs["init_scale"] = GUIDE_INIT_SCALE
+    return partial(guide_fn, **guide_kwargs)
+
+
+def init_to_MAP(model, data, init_values, iters, lr, rng_key=None):
+    """
+    Like `ef.init_to_MAP`, but start the MAP estimate from *init_values*, if
+    they are not None, and from the random state *rng_key*.
+    Returns the initialization strategy for MCMC and the MAP estimates.
+    """
+    infer_map = ef.InferMAP(iters=iters, lr=lr, rng_key=rng_key)
+    if init_values is not None:
+        infer_map.guide_fn = warm_start_guide(AutoDelta, init_values)
+    MAP = infer_map.fit(model, data)
+
+    samples = {
+        k: jnp.squeeze(v, axis=0) if v.shape[0] == 1 else v
+        for k, v in MAP.samples.items()
+    }
+    return init_to_value(values=samples), MAP
@@ -0,0 +1,196 @@
+"""
+Generate deterministic synthetic inputs for benchmarking the ingest and
+prepare stages of the workflow.
+
+Writes the following files to the output directory:
+
+    metadata.tsv              Sequence metadata for `summarize-clade-sequence-counts`
+    nextstrain_clades.tsv     Clade sequence counts for `prepare-data.py`
+    cases.tsv                 Case counts for `prepare-data.py`
+    pango_lineages.tsv        Prepared lineage sequence counts for `collapse-lineage-counts.py`
+    alias_key.json            Pango alias key for the synthetic lineages
+"""
+import argparse
+import json
+import numpy as np
+import os
+import pandas as pd
+
+from datetime import datetime, timedelta
+
+
+# Fraction of metadata dates that are incomplete or ambiguous
+AMBIGUOUS_DATE_FRACTION = 0.05
+AMBIGUOUS_DATES = np.array(["2022", "2022-01", "XXXX-XX-XX", "2022-XX-XX"], dtype=object)
+QC_STATUSES = np.array(["good", "mediocre", "bad"], dtype=object)
+QC_STATUS_WEIGHTS = [0.8, 0.15, 0.05]
+
+
+def make_dates(max_date, days):
+    """
+    Return *days* ISO 8601 dates up to and including *max_date*.
+    """
+    max_date = datetime.strptime(max_date, "%Y-%m-%d")
+    return np.array([
+        (max_date - timedelta(days=days - 1 - day)).strftime("%Y-%m-%d")
+        for day in range(days)
+    ], dtype=object)
+
+
+def make_lineages(n_lineages, rng):
+    """
+    Return *n_lineages* synthetic Pango lineage names and their alias key.
+
+    Lineages are generated as a random tree of uncompressed names rooted at
+    'B', where every uncompressed name with 3k+1 levels is given an alias so
+    that the compressed names behave like real Pango lineages.
+    """
+    uncompressed = ["B"]
+    children = {"B": 0}
+    while len(uncompressed) < n_lineages + 1:
+        # Prefer extending recent lineages to get deep lineage trees
+        parent = uncompressed[int(len(uncompressed) * rng.random() ** 0.5)]
+        children[parent] += 1
+        child = f"{parent}.{children[parent]}"
+        uncompressed.append(child)
+        children[child] = 0
+
+    alias_key = {"A": "", "B": ""}
+    aliases = {}
+    for lineage in uncompressed:
+        levels = lineage.count(".")
+        if levels > 0 and levels % 3 == 0:
+            alias = _alias_name(len(aliases))
+            aliases[lineage] = alias
+            alias_key[alias] = lineage
+
+    def compress(lineage):
+        parts = lineage.split(".")
+        indirections = (len(parts) - 2) // 3
+        if indirections <= 0:
+            return lineage
+        prefix = ".".join(parts[:3 * indirections + 1])
+        return ".".join([aliases[prefix], *parts[3 * indirections + 1:]])
+
+    return [compress(lineage) for lineage in uncompressed[1:]], alias_key
+
+
+def _alias_name(index):
+    """
+    Return a unique alias name for the *index*, using two or more of the
+    letters that are not already used by the root lineages.
+    """
+    letters = "CDEFGHJKLMNPQRSTUVWYZ"
+    name = ""
+    index += len(letters)
+    while index:
+        index, remainder = divmod(index, len(letters))
+        name = letters[remainder] + name
+    return name
+
+
+def weighted_choice(values, size, rng):
+    """
+    Return *size* random *values* with Zipf-like weights, so a few values are
+    much more common than the rest like real locations and clades.
+    """
+    weights = 1.0 / np.arange(1, len(values) + 1)
+    return rng.choice(values, size=size, p=weights / weights.sum())
+
+
+def make_metadata(sequences, locations, clades, lineages, dates, rng):
+    """
+    Return synthetic metadata for *sequences* sequences.
+    """
+    metadata_dates = rng.choice(dates, size=sequences)
+    ambiguous = rng.random(sequences) < AMBIGUOUS_DATE_FRACTION
+    metadata_dates[ambiguous] = rng.choice(AMBIGUOUS_DATES, size=ambiguous.sum())
+
+    countries = weighted_choice(np.append(locations[:-1], "USA"), sequences, rng)
+    divisions = np.where(
+        countries == "USA",
+        weighted_choice(np.array([f"State {i}" for i in range(50)], dtype=object), sequences, rng),
+        countries,
+    )
+
+    return pd.DataFrame({
+        "strain": [f"synthetic/{i}" for i in range(sequences)],
+        "date": metadata_dates,
+        "country": countries,
+        "division": divisions,
+        "clade_nextstrain": weighted_choice(clades, sequences, rng),
+        "Nextclade_pango": weighted_choice(lineages, sequences, rng),
+        "QC_overall_status": rng.choice(QC_STATUSES, size=sequences, p=QC_STATUS_WEIGHTS),
+    })
+
+
+def make_seq_counts(sequences, locations, variants, dates, rng, variant_column):
+    """
+    Return synthetic sequence counts that sum to about *sequences* across
+    locations, variants and dates.
+    """
+    counts = pd.DataFrame({
+        "location": weighted_choice(locations, sequences, rng),
+        variant_column: weighted_choice(variants, sequences, rng),
+        "date": rng.choice(dates, size=sequences),
+    })
+    return counts.groupby(["location", variant_column, "date"]) \
+                 .size() \
+                 .reset_index(name="sequences")
+
+
+def make_cases(locations, dates, rng):
+    """
+    Return synthetic daily case counts for all *locations* and *dates*.
+    """
+    cases = pd.MultiIndex.from_product([locations, dates], names=["location", "date"]).to_frame(index=False)
+    cases["cases"] = rng.poisson(1000, size=len(cases))
+    return cases
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--sequences", type=int, default=100000,
+        help="Number of sequences in the metadata and summed across the sequence counts.")
+    parser.add_argument("--locations", type=int, default=100,
+        help="Number of locations.")
+    parser.add_argument("--clades", type=int, default=30,
+        help="Number of Nextstrain clades.")
+    parser.add_argument("--lineages", type=int, default=1000,
+        help="Number of Pango lineages.")
+    parser.add_argument("--days", type=int, default=150,
+        help="Number of days up to the max date.")
+    parser.add_argument("--max-date", default="2022-06-01",
+        help="The last date of the synthetic data, formatted as 'YYYY-MM-DD'.")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for the random number generator.")
+    parser.add_argument("--output-dir", required=True,
+        help="Directory to write the synthetic data files to.")
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    dates = make_dates(args.max_date, args.days)
+    locations = np.array([f"Location {i}" for i in range(args.locations)], dtype=object)
+    clades = np.array([f"{20 + i // 26}{chr(ord('A') + i % 26)}" for i in range(args.clades)], dtype=object)
+    lineages, alias_key = make_lineages(args.lineages, rng)
+    lineages = np.array(lineages, dtype=object)
+
+    make_metadata(args.sequences, locations, clades, lineages, dates, rng) \
+        .to_csv(os.path.join(args.output_dir, "metadata.tsv"), sep="\t", index=False)
+
+    make_seq_counts(args.sequences, locations, clades, dates, rng, "clade") \
+        .to_csv(os.path.join(args.output_dir, "nextstrain_clades.tsv"), sep="\t", index=False)
+
+    make_seq_counts(args.sequences, locations, lineages, dates, rng, "variant") \
+        .to_csv(os.path.join(args.output_dir, "pango_lineages.tsv"), sep="\t", index=False)
+
+    make_cases(locations, dates, rng) \
+        .to_csv(os.path.join(args.output_dir, "cases.tsv"), sep="\t", index=False)
+
+    with open(os.path.join(args.output_dir, "alias_key.json"), "w") as fh:
+        json.dump(alias_key, fh, indent=1)
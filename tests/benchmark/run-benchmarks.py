@@ -0,0 +1,171 @@
+"""
+Benchmark the ingest and prepare stages of the workflow on deterministic
+synthetic data at several scales.
+
+For each scale, synthetic data is generated with `generate-synthetic-data.py`
+and each benchmarked command is run in a separate process to record its wall
+time and peak resident memory (RSS). Results are written as a TSV with one row
+per scale and benchmark.
+
+When a previous results TSV is passed with `--baseline`, the script exits with
+an error if any benchmark is slower or uses more memory than the baseline by
+more than the allowed `--tolerance`.
+"""
+import argparse
+import os
+import pandas as pd
+import subprocess
+import sys
+import time
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BENCHMARK_DIR, "..", ".."))
+
+# Arguments to `generate-synthetic-data.py` for each scale
+SCALES = {
+    "small": {"sequences": 100000, "locations": 50, "clades": 20, "lineages": 500, "days": 150},
+    "medium": {"sequences": 1000000, "locations": 150, "clades": 30, "lineages": 2000, "days": 150},
+    "large": {"sequences": 5000000, "locations": 250, "clades": 40, "lineages": 5000, "days": 365},
+}
+
+BENCHMARKS = ["summarize-clade-sequence-counts", "prepare-data", "collapse-lineage-counts"]
+
+RESULT_COLUMNS = ["scale", "benchmark", "wall_seconds", "max_rss_mb"]
+
+
+def benchmark_commands(data_dir, output_dir, max_date):
+    """
+    Return the command to run for each benchmark, reading inputs from
+    *data_dir* and writing outputs to *output_dir*.
+    """
+    return {
+        "summarize-clade-sequence-counts": [
+            sys.executable, os.path.join(ROOT_DIR, "ingest", "bin", "summarize-clade-sequence-counts"),
+            "--metadata", os.path.join(data_dir, "metadata.tsv"),
+            "--clade-column", "clade_nextstrain",
+            "--filter-columns", "QC_overall_status",
+            "--filter-query", "QC_overall_status != 'bad'",
+            "--output", os.path.join(output_dir, "summarized_clades.tsv"),
+        ],
+        "prepare-data": [
+            sys.executable, os.path.join(ROOT_DIR, "scripts", "prepare-data.py"),
+            "--seq-counts", os.path.join(data_dir, "nextstrain_clades.tsv"),
+            "--cases", os.path.join(data_dir, "cases.tsv"),
+            "--max-date", max_date,
+            "--included-days", "150",
+            "--location-min-seq", "300",
+            "--location-min-seq-days", "30",
+            "--clade-min-seq", "5000",
+            "--clade-min-seq-days", "150",
+            "--output-seq-counts", os.path.join(output_dir, "prepared_seq_counts.tsv"),
+            "--output-cases", os.path.join(output_dir, "prepared_cases.tsv"),
+        ],
+        "collapse-lineage-counts": [
+            sys.executable, os.path.join(ROOT_DIR, "scripts", "collapse-lineage-counts.py"),
+            "--seq-counts", os.path.join(data_dir, "pango_lineages.tsv"),
+            "--collapse-threshold", "200",
+            "--pango-alias", os.path.join(data_dir, "alias_key.json"),
+            "--output-seq-counts", os.path.join(output_dir, "collapsed_seq_counts.tsv"),
+        ],
+    }
+
+
+def run_benchmark(command, log):
+    """
+    Run *command* in a child process, writing its output to *log*, and
+    return its wall time in seconds and peak RSS in MB.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    # Wait on the child process directly to get its own resource usage
+    # instead of the usage accumulated across all child processes.
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    max_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return wall_seconds, max_rss_mb
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a list of regressions where the *results* are worse than the
+    *baseline* results by more than the *tolerance* fraction.
+    """
+    merged = results.merge(baseline, on=["scale", "benchmark"], suffixes=("", "_baseline"))
+    regressions = []
+    for metric in ("wall_seconds", "max_rss_mb"):
+        worse = merged[merged[metric] > merged[f"{metric}_baseline"] * (1 + tolerance)]
+        for row in worse.itertuples(index=False):
+            regressions.append(
+                f"{row.benchmark} ({row.scale}): {metric} = {getattr(row, metric):.2f}, "
+                f"baseline = {getattr(row, metric + '_baseline'):.2f}"
+            )
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("--scales", nargs="+", choices=SCALES.keys(), default=["small"],
+        help="Scales of synthetic data to run the benchmarks at.")
+    parser.add_argument("--benchmarks", nargs="+",
+        choices=BENCHMARKS, default=BENCHMARKS,
+        help="Benchmarks to run.")
+    parser.add_argument("--max-date", default="2022-06-01",
+        help="The last date of the synthetic data, formatted as 'YYYY-MM-DD'.")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for the synthetic data generator.")
+    parser.add_argument("--work-dir", default=os.path.join(ROOT_DIR, "benchmark-data"),
+        help="Directory for the synthetic data and benchmark outputs. " +
+             "Existing synthetic data for a scale is reused.")
+    parser.add_argument("--output", required=True,
+        help="Path to the output TSV of benchmark results.")
+    parser.add_argument("--baseline",
+        help="Path to a previous TSV of benchmark results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+        help="Allowed fraction that a benchmark can be slower or use more memory than the baseline.")
+
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        data_dir = os.path.join(args.work_dir, scale, "data")
+        output_dir = os.path.join(args.work_dir, scale, "output")
+        os.makedirs(output_dir, exist_ok=True)
+
+        if not os.path.exists(os.path.join(data_dir, "metadata.tsv")):
+            print(f"Generating {scale} synthetic data in {data_dir!r}", file=sys.stderr)
+            subprocess.run([
+                sys.executable, os.path.join(BENCHMARK_DIR, "generate-synthetic-data.py"),
+                *[f"--{key}={value}" for key, value in SCALES[scale].items()],
+                "--max-date", args.max_date,
+                "--seed", str(args.seed),
+                "--output-dir", data_dir,
+            ], check=True)
+
+        commands = benchmark_commands(data_dir, output_dir, args.max_date)
+        for benchmark in args.benchmarks:
+            print(f"Running {benchmark} on {scale} synthetic data", file=sys.stderr)
+            with open(os.path.join(output_dir, f"{benchmark}.log"), "w") as log:
+                wall_seconds, max_rss_mb = run_benchmark(commands[benchmark], log)
+
+            print(f"  {wall_seconds:.2f} s, {max_rss_mb:.1f} MB", file=sys.stderr)
+            results.append((scale, benchmark, round(wall_seconds, 3), round(max_rss_mb, 1)))
+
+    results = pd.DataFrame(results, columns=RESULT_COLUMNS)
+    results.to_csv(args.output, sep="\t", index=False)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, pd.read_csv(args.baseline, sep="\t"), args.tolerance)
+        if regressions:
+            print(f"ERROR: Benchmarks regressed by more than {args.tolerance:.0%} from the baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
@@ -3,6 +3,7 @@ This should collapse everything to BQ.1 since the other lineages do not meet the
 
   $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
   > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TESTDIR/../data/alias_key.json" \
   > --collapse-threshold 20 \
   > --output-seq-counts "$TESTDIR/collapsed_seq_counts.tsv" > /dev/null
 
@@ -5,6 +5,7 @@ deepest lineages first.
 
   $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
   > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TESTDIR/../data/alias_key.json" \
   > --collapse-threshold 12 \
   > --output-seq-counts "$TESTDIR/collapsed_seq_counts.tsv" > /dev/null
 
@@ -0,0 +1,83 @@
+Collapse lineages with a threshold of 12, saving the resolved lineages to a
+Pango alias cache that does not exist yet.
+
+  $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
+  > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TESTDIR/../data/alias_key.json" \
+  > --pango-alias-cache "$TMP/pango_alias_cache/cache.json" \
+  > --collapse-threshold 12 \
+  > --output-seq-counts "$TMP/collapsed_seq_counts.tsv" > /dev/null
+
+The cache should include the lineages that were resolved to collapse BQ.1.1.1 into BQ.1.1.
+
+  $ python3 -c '
+  > import json, sys
+  > cache = json.load(open(sys.argv[1]))
+  > print(cache["parents"])
+  > print(cache["uncompressed"])
+  > ' "$TMP/pango_alias_cache/cache.json"
+  {'BQ.1.1.1': 'BQ.1.1'}
+  {'BQ.1.1': 'B.1.1.529.5.3.1.1.1.1.1.1', 'BQ.1.1.1': 'B.1.1.529.5.3.1.1.1.1.1.1.1'}
+
+Rerunning with the cache should give the same output without rewriting the
+cache, since no new lineages are resolved.
+
+  $ cp "$TMP/pango_alias_cache/cache.json" "$TMP/cache.json"
+  $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
+  > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TESTDIR/../data/alias_key.json" \
+  > --pango-alias-cache "$TMP/pango_alias_cache/cache.json" \
+  > --collapse-threshold 12 \
+  > --output-seq-counts "$TMP/cached_collapsed_seq_counts.tsv" > /dev/null
+
+  $ diff "$TMP/collapsed_seq_counts.tsv" "$TMP/cached_collapsed_seq_counts.tsv"
+  $ cmp "$TMP/cache.json" "$TMP/pango_alias_cache/cache.json"
+
+Cached lineages are used instead of resolving them again, so changing the
+cached parent of BQ.1.1.1 to BQ.1 should collapse BQ.1.1.1 into BQ.1, leaving
+BQ.1.1 below the threshold to be collapsed into BQ.1 as well.
+
+  $ sed -i.bak 's/"BQ.1.1.1": "BQ.1.1"/"BQ.1.1.1": "BQ.1"/' "$TMP/pango_alias_cache/cache.json"
+  $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
+  > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TESTDIR/../data/alias_key.json" \
+  > --pango-alias-cache "$TMP/pango_alias_cache/cache.json" \
+  > --collapse-threshold 12 \
+  > --output-seq-counts "$TMP/cached_collapsed_seq_counts.tsv" > /dev/null
+
+  $ cat "$TMP/cached_collapsed_seq_counts.tsv"
+  location\tvariant\tdate\tsequences (esc)
+  USA\tBQ.1\t2022-11-27\t16 (esc)
+  USA\tBQ.1\t2022-11-28\t17 (esc)
+
+The cache is ignored if it was resolved with a different alias key, so a
+changed alias key should resolve the lineages again.
+
+  $ sed 's/"A": ""/"A": "", "BF": "B.1.1.529.5.2.1"/' "$TESTDIR/../data/alias_key.json" > "$TMP/alias_key.json"
+  $ python3 "$TESTDIR/../../../scripts/collapse-lineage-counts.py" \
+  > --seq-counts "$TESTDIR/../data/prepared_seq_counts.tsv" \
+  > --pango-alias "$TMP/alias_key.json" \
+  > --pango-alias-cache "$TMP/pango_alias_cache/cache.json" \
+  > --collapse-threshold 12 \
+  > --output-seq-counts "$TMP/cached_collapsed_seq_counts.tsv" > /dev/null
+
+  $ diff "$TMP/collapsed_seq_counts.tsv" "$TMP/cached_collapsed_seq_counts.tsv"
+  $ cmp "$TMP/cache.json" "$TMP/pango_alias_cache/cache.json"
+  * differ: * (glob)
+  [1]
+
+Lineage jobs share a single cache, so lineages saved by another job since the
+cache was loaded should be kept when saving.
+
+  $ PYTHONPATH="$TESTDIR/../../../scripts" python3 -c '
+  > import json, sys
+  > from pango_aliases import PangoAliases
+  > first = PangoAliases(sys.argv[1], sys.argv[2])
+  > second = PangoAliases(sys.argv[1], sys.argv[2])
+  > first.parent("BQ.1.1.1")
+  > second.parent("BQ.1.1")
+  > first.save()
+  > second.save()
+  > print(json.load(open(sys.argv[2]))["parents"])
+  > ' "$TESTDIR/../data/alias_key.json" "$TMP/shared_cache.json"
+  {'BQ.1.1.1': 'BQ.1.1', 'BQ.1.1': 'BQ.1'}
@@ -0,0 +1,53 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Order and colour the Pango lineages of the results by parsing the full results JSON.
+
+  $ python3 ../../../scripts/modify-lineage-colours-and-order.py \
+  > --input ../data/results.json \
+  > --output "$TMP/results.json" \
+  > --variant-classification pango_lineages \
+  > --config "$(cat ../data/clade_definitions.json)" \
+  > --pango-alias ../data/alias_key.json > /dev/null
+
+  $ python3 -c '
+  > import json, sys
+  > metadata = json.load(open(sys.argv[1]))["metadata"]
+  > print(metadata["variants"])
+  > print(metadata["variantColors"])
+  > ' "$TMP/results.json"
+  ['BA.2', 'BQ.1', 'BQ.1.1', 'XBB.1.5', 'other']
+  [['BA.2', '#8e8e8e'], ['other', '#777777'], ['BQ.1', '#e6544c'], ['BQ.1.1', '#e5291a'], ['XBB.1.5', '#f07d57']]
+
+Only parse and rewrite the metadata with `--metadata-only`.
+The rest of the results is copied through unchanged, so the output should be
+identical to the output of parsing the full results.
+
+  $ python3 ../../../scripts/modify-lineage-colours-and-order.py \
+  > --input ../data/results.json \
+  > --output "$TMP/metadata_only_results.json" \
+  > --variant-classification pango_lineages \
+  > --config "$(cat ../data/clade_definitions.json)" \
+  > --pango-alias ../data/alias_key.json \
+  > --metadata-only > /dev/null
+
+  $ cmp "$TMP/results.json" "$TMP/metadata_only_results.json"
+
+If the metadata is not the first key of the results, `--metadata-only` should
+fall back to parsing the full results.
+
+  $ python3 ../../../scripts/modify-lineage-colours-and-order.py \
+  > --input ../data/results_data_first.json \
+  > --output "$TMP/data_first_results.json" \
+  > --variant-classification pango_lineages \
+  > --config "$(cat ../data/clade_definitions.json)" \
+  > --pango-alias ../data/alias_key.json \
+  > --metadata-only | grep "metadata"
+  The metadata is not the first key of the results JSON: parsing the full results
+
+  $ python3 -c '
+  > import json, sys
+  > print(json.load(open(sys.argv[1])) == json.load(open(sys.argv[2])))
+  > ' "$TMP/results.json" "$TMP/data_first_results.json"
+  True
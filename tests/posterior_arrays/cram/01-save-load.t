@@ -0,0 +1,101 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export PYTHONPATH="$TMP:$PWD/../../../scripts${PYTHONPATH:+:$PYTHONPATH}"
+
+Create a posterior of a hierarchical model of 4 variants in 3 locations over 2 dates.
+
+  $ cat > "$TMP/posterior_fixture.py" <<'PY'
+  > from types import SimpleNamespace
+  > import numpy as np
+  > import pandas as pd
+  > 
+  > data = SimpleNamespace(
+  >     dates=list(pd.date_range("2022-06-01", periods=2)),
+  >     var_names=["20B", "20C", "21A", "other"],
+  >     names=["Alpha", "Beta", "Gamma"],
+  > )
+  > rng = np.random.default_rng(0)
+  > samples = {
+  >     "freq": rng.dirichlet(np.ones(4), size=(5, 2, 3)).transpose(0, 1, 3, 2).astype("float32"),
+  >     "ga": rng.lognormal(size=(5, 3, 3)),
+  >     "losses": rng.normal(size=10),
+  > }
+  > posterior = SimpleNamespace(name="hierarchical", samples=samples, data=data)
+  > PY
+
+Save the posterior as posterior arrays.
+
+  $ python3 - "$TMP/test.posterior" <<'PY'
+  > import sys
+  > from posterior_arrays import save_posterior_arrays
+  > from posterior_fixture import posterior
+  > save_posterior_arrays(posterior, sys.argv[1])
+  > PY
+  $ ls "$TMP/test.posterior"
+  freq.npy
+  ga.npy
+  header.json
+  losses.npy
+
+The header should label the dims of each site with the coordinates of the data.
+
+  $ python3 - "$TMP/test.posterior" <<'PY'
+  > import sys
+  > from posterior_arrays import read_posterior_header
+  > header = read_posterior_header(sys.argv[1])
+  > print(header["name"], header["coords"])
+  > for site, info in header["sites"].items():
+  >     print(site, info["dtype"], info["shape"], info["dims"])
+  > PY
+  hierarchical {'date': ['2022-06-01', '2022-06-02'], 'variant': ['20B', '20C', '21A', 'other'], 'location': ['Alpha', 'Beta', 'Gamma']}
+  freq <f4 [5, 2, 4, 3] ['sample', 'date', 'variant', 'location']
+  ga <f8 [5, 3, 3] ['sample', 'ga_dim_1', 'location']
+  losses <f8 [10] ['iteration']
+
+Loading the posterior arrays should memory-map the samples of the requested
+sites, which are identical to the saved samples.
+
+  $ python3 - "$TMP/test.posterior" <<'PY'
+  > import sys
+  > import numpy as np
+  > from posterior_arrays import load_posterior_arrays
+  > from posterior_fixture import samples
+  > loaded = load_posterior_arrays(sys.argv[1], sites=["freq", "ga"])
+  > print(sorted(loaded))
+  > print(all(isinstance(loaded[site], np.memmap) for site in loaded))
+  > print(all(np.array_equal(loaded[site], samples[site]) for site in loaded))
+  > PY
+  ['freq', 'ga']
+  True
+  True
+
+Loading sites that were not saved is an error.
+
+  $ python3 - "$TMP/test.posterior" <<'PY'
+  > import sys
+  > from posterior_arrays import load_posterior_arrays
+  > try:
+  >     load_posterior_arrays(sys.argv[1], sites=["freq", "freq_forecast"])
+  > except KeyError as error:
+  >     print(error)
+  > PY
+  "Posterior arrays '*/test.posterior' have no sites ['freq_forecast']" (glob)
+
+Saving the posterior again should replace all previously saved sites without
+leaving temporary directories behind.
+
+  $ python3 - "$TMP/test.posterior" <<'PY'
+  > import sys
+  > from posterior_arrays import save_posterior_arrays
+  > from posterior_fixture import posterior
+  > del posterior.samples["losses"]
+  > save_posterior_arrays(posterior, sys.argv[1])
+  > PY
+  $ ls "$TMP/test.posterior"
+  freq.npy
+  ga.npy
+  header.json
+  $ ls -A "$TMP" | grep 'posterior'
+  posterior_fixture.py
+  test.posterior
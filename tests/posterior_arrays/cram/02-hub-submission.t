@@ -0,0 +1,58 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Save the same posterior samples of a hierarchical model as a JSON posterior
+and as posterior arrays. Samples are in the shape of (samples, dates,
+variants, locations) with "hierarchical" as the last location.
+
+  $ python3 - "$TMP/posterior.json" "$TMP/hierarchical.posterior" <<'PY'
+  > import json, os, sys
+  > import numpy as np
+  > rng = np.random.default_rng(0)
+  > samples = {
+  >     site: rng.dirichlet(np.ones(4), size=(4, 2, 3)).transpose(0, 1, 3, 2)
+  >     for site in ("freq", "freq_forecast")
+  > }
+  > with open(sys.argv[1], "w") as fh:
+  >     json.dump({site: values.tolist() for site, values in samples.items()}, fh)
+  > os.mkdir(sys.argv[2])
+  > header = {"name": "hierarchical", "coords": {}, "sites": {}}
+  > for site, values in samples.items():
+  >     np.save(os.path.join(sys.argv[2], f"{site}.npy"), values)
+  >     header["sites"][site] = {"dtype": values.dtype.str, "shape": list(values.shape), "dims": ["sample", "date", "variant", "location"]}
+  > with open(os.path.join(sys.argv[2], "header.json"), "w") as fh:
+  >     json.dump(header, fh)
+  > PY
+
+Prepare the hub submission from the JSON posterior.
+
+  $ python3 ../../../scripts/prepare_hub_submission.py \
+  > --hub-tasks ../data/hub_tasks.json \
+  > --model ../data/model_results.json \
+  > --posterior "$TMP/posterior.json" \
+  > --state-to-abbreviation-map ../data/state_to_abbreviation.csv \
+  > --output "$TMP/json_submission.parquet" > /dev/null
+
+Prepare the hub submission from the posterior arrays.
+The submission should be identical to the submission from the JSON posterior.
+
+  $ python3 ../../../scripts/prepare_hub_submission.py \
+  > --hub-tasks ../data/hub_tasks.json \
+  > --model ../data/model_results.json \
+  > --posterior "$TMP/hierarchical.posterior" \
+  > --state-to-abbreviation-map ../data/state_to_abbreviation.csv \
+  > --output "$TMP/arrays_submission.parquet" > /dev/null
+
+  $ python3 -c '
+  > import sys
+  > import pandas as pd
+  > json_submission = pd.read_parquet(sys.argv[1])
+  > arrays_submission = pd.read_parquet(sys.argv[2])
+  > print(json_submission.equals(arrays_submission))
+  > print(len(arrays_submission), *sorted(arrays_submission["target_date"].astype(str).unique()))
+  > print(*sorted(arrays_submission["output_type_id"].unique()))
+  > ' "$TMP/json_submission.parquet" "$TMP/arrays_submission.parquet"
+  True
+  36 2022-06-02 2022-06-03 2022-06-04
+  AL1 AL2 BE1 BE2
@@ -0,0 +1,55 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Convert the test sequence counts and case counts to Parquet files.
+
+  $ python3 -c '
+  > import sys; sys.path.insert(0, "../../../scripts")
+  > from count_tables import read_counts, write_counts
+  > write_counts(read_counts("../data/nextstrain_clades.tsv"), sys.argv[1])
+  > write_counts(read_counts("../data/cases.tsv"), sys.argv[2])
+  > ' "$TMP/nextstrain_clades.parquet" "$TMP/cases.parquet"
+
+The Parquet files should have typed columns.
+
+  $ python3 -c '
+  > import sys, pyarrow.parquet as pq
+  > for path in sys.argv[1:]:
+  >     print(*(f"{field.name}:{field.type}" for field in pq.read_schema(path)))
+  > ' "$TMP/nextstrain_clades.parquet" "$TMP/cases.parquet"
+  location:dictionary<values=string, indices=int32, ordered=0> clade:dictionary<values=string, indices=int32, ordered=0> date:date32[day] sequences:int32
+  location:dictionary<values=string, indices=int32, ordered=0> date:date32[day] cases:int32
+
+Prepare the data from the TSV files and from the Parquet files, writing the
+prepared data from the Parquet files as Parquet files.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --cases ../data/cases.tsv \
+  > --max-date 2022-01-10 \
+  > --included-days 5 \
+  > --output-seq-counts "$TMP/prepared_seq_counts.tsv" \
+  > --output-cases "$TMP/prepared_cases.tsv" > /dev/null
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts "$TMP/nextstrain_clades.parquet" \
+  > --cases "$TMP/cases.parquet" \
+  > --max-date 2022-01-10 \
+  > --included-days 5 \
+  > --output-seq-counts "$TMP/prepared_seq_counts.parquet" \
+  > --output-cases "$TMP/prepared_cases.parquet" > /dev/null
+
+Verify that the prepared Parquet files have the same rows as the prepared TSV files.
+
+  $ python3 -c '
+  > import sys; sys.path.insert(0, "../../../scripts")
+  > from count_tables import read_counts
+  > for path in sys.argv[1:]:
+  >     read_counts(path).to_csv(f"{path}.tsv", sep="\t", index=False)
+  > ' "$TMP/prepared_seq_counts.parquet" "$TMP/prepared_cases.parquet"
+
+  $ diff "$TMP/prepared_seq_counts.tsv" "$TMP/prepared_seq_counts.parquet.tsv"
+  $ diff "$TMP/prepared_cases.tsv" "$TMP/prepared_cases.parquet.tsv"
+  $ wc -l < "$TMP/prepared_cases.parquet.tsv" | sed 's/^[[:space:]]*//'
+  21
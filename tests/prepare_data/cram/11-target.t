@@ -0,0 +1,72 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Prepare two targets with different options from the same input files with
+the single target options, one target per run.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --cases ../data/cases.tsv \
+  > --max-date 2022-01-10 \
+  > --output-seq-counts "$TMP/all_seq_counts.tsv" \
+  > --output-cases "$TMP/all_cases.tsv" > /dev/null
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --cases ../data/cases.tsv \
+  > --max-date 2022-01-08 \
+  > --included-days 3 \
+  > --clade-min-seq 5 \
+  > --excluded-locations ../data/excluded_locations.txt \
+  > --output-seq-counts "$TMP/subset_seq_counts.tsv" \
+  > --output-cases "$TMP/subset_cases.tsv" > /dev/null
+
+Prepare both targets in a single run with `--target`, which reads the input
+files once for both targets.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --target '{"seq_counts": "../data/nextstrain_clades.tsv", "cases": "../data/cases.tsv", "max_date": "2022-01-10", "output_seq_counts": "'"$TMP"'/target_all_seq_counts.tsv", "output_cases": "'"$TMP"'/target_all_cases.tsv"}' \
+  > --target '{"seq_counts": "../data/nextstrain_clades.tsv", "cases": "../data/cases.tsv", "max_date": "2022-01-08", "included_days": 3, "clade_min_seq": "5", "excluded_locations": "../data/excluded_locations.txt", "output_seq_counts": "'"$TMP"'/target_subset_seq_counts.tsv", "output_cases": "'"$TMP"'/target_subset_cases.tsv"}' \
+  > | grep '^Preparing' | sed "s|$TMP/||g"
+  Preparing 'target_all_seq_counts.tsv' and 'target_all_cases.tsv'.
+  Preparing 'target_subset_seq_counts.tsv' and 'target_subset_cases.tsv'.
+
+Verify that the outputs of each target are identical to the outputs of the
+single target runs.
+
+  $ diff "$TMP/all_seq_counts.tsv" "$TMP/target_all_seq_counts.tsv"
+  $ diff "$TMP/all_cases.tsv" "$TMP/target_all_cases.tsv"
+  $ diff "$TMP/subset_seq_counts.tsv" "$TMP/target_subset_seq_counts.tsv"
+  $ diff "$TMP/subset_cases.tsv" "$TMP/target_subset_cases.tsv"
+
+Verify that the targets were prepared with their own options.
+
+  $ echo $(tsv-select -H -f location "$TMP/target_subset_cases.tsv" | tsv-uniq -H | tail -n +2 | sort)
+  Argentina USA
+  $ echo $(tsv-select -H -f date "$TMP/target_subset_cases.tsv" | tsv-uniq -H | tail -n +2 | sort | tsv-summarize --first 1 --last 1)
+  2022-01-06 2022-01-08
+  $ echo $(tsv-select -H -f variant "$TMP/target_subset_seq_counts.tsv" | tsv-uniq -H | tail -n +2 | sort)
+  19A 21A 21I 21J 21K 21L other
+
+Single target options cannot be combined with `--target`.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --target '{"seq_counts": "../data/nextstrain_clades.tsv", "cases": "../data/cases.tsv", "output_seq_counts": "'"$TMP"'/seq_counts.tsv", "output_cases": "'"$TMP"'/cases.tsv"}' 2>&1 | tail -n 1
+  *error: --seq-counts cannot be used with --target. (glob)
+
+This includes the single target options of the data subset, which would
+otherwise be ignored.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --max-date 2022-01-08 \
+  > --clade-min-seq 5 \
+  > --target '{"seq_counts": "../data/nextstrain_clades.tsv", "cases": "../data/cases.tsv", "output_seq_counts": "'"$TMP"'/seq_counts.tsv", "output_cases": "'"$TMP"'/cases.tsv"}' 2>&1 | tail -n 1
+  *error: --max-date, --clade-min-seq cannot be used with --target. (glob)
+
+Targets must include all input and output paths.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --target '{"seq_counts": "../data/nextstrain_clades.tsv", "cases": "../data/cases.tsv", "output_seq_counts": "'"$TMP"'/seq_counts.tsv"}' 2>&1 | tail -n 1
+  *error: argument --target: Target * must include 'output_cases'. (glob)
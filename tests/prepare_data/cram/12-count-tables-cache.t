@@ -0,0 +1,35 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export COUNT_TABLES_CACHE_DIR="$TMP/count_tables_cache"
+
+Prepare the data with an empty count tables cache, which caches the parsed
+sequence counts and case counts as Parquet files.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --cases ../data/cases.tsv \
+  > --max-date 2022-01-10 \
+  > --included-days 5 \
+  > --output-seq-counts "$TMP/prepared_seq_counts.tsv" \
+  > --output-cases "$TMP/prepared_cases.tsv" > /dev/null
+
+  $ ls "$COUNT_TABLES_CACHE_DIR" | sed 's/^[0-9a-f]*//'
+  .parquet
+  .parquet
+
+Prepare the data again from the cached tables.
+The outputs should be identical to the outputs from the parsed tables.
+
+  $ python3 ../../../scripts/prepare-data.py \
+  > --seq-counts ../data/nextstrain_clades.tsv \
+  > --cases ../data/cases.tsv \
+  > --max-date 2022-01-10 \
+  > --included-days 5 \
+  > --output-seq-counts "$TMP/cached_prepared_seq_counts.tsv" \
+  > --output-cases "$TMP/cached_prepared_cases.tsv" > /dev/null
+
+  $ diff "$TMP/prepared_seq_counts.tsv" "$TMP/cached_prepared_seq_counts.tsv"
+  $ diff "$TMP/prepared_cases.tsv" "$TMP/cached_prepared_cases.tsv"
+  $ ls "$COUNT_TABLES_CACHE_DIR" | wc -l | sed 's/^[[:space:]]*//'
+  2
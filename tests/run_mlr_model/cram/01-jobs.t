@@ -0,0 +1,40 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Fit the models of the locations one at a time and in 3 parallel processes.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/jobs_1" > /dev/null
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/jobs_3" \
+  >   --jobs 3 > /dev/null
+
+Each location is fit from its own random state, so the fits in parallel
+processes should be identical to the fits one at a time.
+
+  $ ls "$TMP/jobs_3/models"
+  Location A.json
+  Location B.json
+  Location C.json
+
+  $ for model in "$TMP"/jobs_1/models/*.json; do
+  >   cmp "$model" "$TMP/jobs_3/models/$(basename "$model")"
+  > done
+  $ cmp "$TMP/jobs_1/test_results.json" "$TMP/jobs_3/test_results.json"
+
+The random state of a location only depends on its name, so fitting a single
+location should give the same fit as fitting it with the other locations.
+
+  $ awk -F '\t' 'NR == 1 || $1 == "Location B"' ../data/seq_counts.tsv > "$TMP/location_b.tsv"
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path "$TMP/location_b.tsv" \
+  >   --export-path "$TMP/location_b" > /dev/null
+
+  $ cmp "$TMP/jobs_1/models/Location B.json" "$TMP/location_b/models/Location B.json"
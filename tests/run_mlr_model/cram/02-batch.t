@@ -0,0 +1,105 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export PYTHONPATH="$PWD/../../../scripts${PYTHONPATH:+:$PYTHONPATH}"
+
+The padded model of each location should have the same prior and likelihood as
+evofr's MLR model of the location at random coefficients, for locations with
+fewer dates and variants than the others, and padded dates should not
+contribute to the likelihood.
+
+  $ python3 - "$TESTDIR/../data/seq_counts.tsv" <<'PY'
+  > import sys
+  > from functools import partial
+  > import evofr as ef
+  > import jax
+  > import numpy as np
+  > import pandas as pd
+  > from numpyro.infer.util import log_density
+  > from batched_mlr import PaddedData, padded_mlr_numpyro
+  > 
+  > def site_log_probs(model_fn, args, kwargs, params):
+  >     _, trace = log_density(model_fn, args, kwargs, params)
+  >     return {
+  >         name: np.asarray(site["fn"].log_prob(site["value"]))
+  >         for name, site in trace.items()
+  >         if site["type"] == "sample"
+  >     }
+  > 
+  > raw_seq = pd.read_csv(sys.argv[1], sep="\t")
+  > datasets = [
+  >     ef.VariantFrequencies(raw_seq=raw_seq[raw_seq.location == location].copy(), pivot="20A")
+  >     for location in raw_seq.location.unique()
+  > ]
+  > model = ef.MultinomialLogisticRegression(tau=4.8)
+  > padded = PaddedData(model, datasets)
+  > padded_model_fn = partial(padded_mlr_numpyro, tau=model.tau)
+  > seq_counts, N, variant_mask = padded.args
+  > 
+  > rng_key = jax.random.PRNGKey(0)
+  > for i, input in enumerate(padded.inputs):
+  >     rng_key, rng_key_ = jax.random.split(rng_key)
+  >     raw_beta = 0.1 * jax.random.normal(rng_key_, (padded.X.shape[1], seq_counts.shape[-1] - 1))
+  >     unpadded_raw_beta = padded.unpad_raw_beta(raw_beta, i)
+  > 
+  >     padded_log_probs = site_log_probs(padded_model_fn, (seq_counts[i], N[i], padded.X, variant_mask[i]), {}, {"raw_beta": raw_beta})
+  >     log_probs = site_log_probs(model.model_fn, (), input, {"raw_beta": unpadded_raw_beta})
+  > 
+  >     n_dates = padded.n_dates[i]
+  >     print(
+  >         padded.n_dates[i], padded.n_variants[i],
+  >         sorted(padded_log_probs) == sorted(log_probs),
+  >         np.allclose(padded_log_probs["raw_beta"][:, :unpadded_raw_beta.shape[-1]], log_probs["raw_beta"], rtol=1e-5, atol=1e-6),
+  >         np.allclose(padded_log_probs["seq_counts"][:n_dates], log_probs["seq_counts"], rtol=1e-5, atol=1e-6),
+  >         np.allclose(padded_log_probs["seq_counts"][n_dates:], 0.0, atol=1e-4),
+  >     )
+  > PY
+  28 3 True True True True
+  21 2 True True True True
+  28 3 True True True True
+
+Fit the MAP estimates of all locations one by one and as one batch.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/locations" > /dev/null
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/batch" \
+  >   --batch > /dev/null
+
+The batched fit should save the posterior of each location with its own
+variants, and its growth advantages should be the same as those of the fits
+of each location.
+
+  $ ls "$TMP/batch/models"
+  Location A.json
+  Location B.json
+  Location C.json
+
+  $ python3 - "$TMP/locations/test_results.json" "$TMP/batch/test_results.json" <<'PY'
+  > import json, sys
+  > def growth_advantages(path):
+  >     return {
+  >         (entry["location"], entry["variant"]): entry["value"]
+  >         for entry in json.load(open(path))["data"]
+  >         if entry["site"] == "ga" and entry.get("ps") == "median"
+  >     }
+  > locations, batch = growth_advantages(sys.argv[1]), growth_advantages(sys.argv[2])
+  > print(sorted(batch))
+  > print(all(abs(locations[key] - batch[key]) < 0.01 for key in locations))
+  > PY
+  [('Location A', '20A'), ('Location A', '21K'), ('Location A', '22B'), ('Location B', '20A'), ('Location B', '21K'), ('Location C', '20A'), ('Location C', '21K'), ('Location C', '22B')]
+  True
+
+Batched fits cannot be warm started.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/batch" \
+  >   --batch --warm-start 2>&1 | tail -n 1
+  *error: --batch cannot be used with --warm-start. (glob)
@@ -0,0 +1,91 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Fits without --warm-start should not save warm starts.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/scratch" > /dev/null
+
+  $ ls "$TMP/scratch"
+  models
+  test_results.json
+
+The first fit with --warm-start starts from scratch and saves the warm start of
+each location for the next run.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/warm" \
+  >   --warm-start > /dev/null
+
+  $ ls "$TMP/warm/warm_start"
+  Location A.json
+  Location B.json
+  Location C.json
+
+The next fit is warm started with the shorter inference.warm_start_iters and
+should have the same growth advantages as the fit from scratch.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/warm" \
+  >   --warm-start > /dev/null
+
+  $ cat > "$TMP/compare_ga.py" <<'PY'
+  > import json, sys
+  > def growth_advantages(path):
+  >     return {
+  >         (entry["location"], entry["variant"]): entry["value"]
+  >         for entry in json.load(open(path))["data"]
+  >         if entry["site"] == "ga" and entry.get("ps") == "median" and entry["location"] != "hierarchical"
+  >     }
+  > expected, results = growth_advantages(sys.argv[1]), growth_advantages(sys.argv[2])
+  > print(len(results), all(abs(expected[key] - results[key]) < 0.01 for key in expected))
+  > PY
+
+  $ python3 "$TMP/compare_ga.py" "$TMP/scratch/test_results.json" "$TMP/warm/test_results.json"
+  8 True
+
+Fits whose pivot has changed since the previous run are started from scratch.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/warm" \
+  >   --pivot 21K \
+  >   --warm-start | grep "Not warm starting"
+  Not warm starting from '*/warm/warm_start/Location A.json': the pivot has changed from '20A' (glob)
+  Not warm starting from '*/warm/warm_start/Location B.json': the pivot has changed from '20A' (glob)
+  Not warm starting from '*/warm/warm_start/Location C.json': the pivot has changed from '20A' (glob)
+
+Hierarchical fits are warm started from the pooled and per location
+coefficients of the previous run. Only the growth advantages of variants
+observed in each location are compared, as the pooled estimates of MAP fits
+to three locations are not identified by the data.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/hier_scratch" \
+  >   --location-ga-inclusion-threshold 1 \
+  >   --hier > /dev/null
+
+  $ for run in 1 2; do
+  >   python3 ../../../scripts/run-mlr-model.py \
+  >     --config ../data/mlr-config.yaml \
+  >     --seq-path ../data/seq_counts.tsv \
+  >     --export-path "$TMP/hier_warm" \
+  >     --location-ga-inclusion-threshold 1 \
+  >     --hier --warm-start > /dev/null
+  > done
+
+  $ ls "$TMP/hier_warm/warm_start"
+  hierarchical.json
+
+  $ python3 "$TMP/compare_ga.py" "$TMP/hier_scratch/test_results.json" "$TMP/hier_warm/test_results.json"
+  8 True
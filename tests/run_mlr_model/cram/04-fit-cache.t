@@ -0,0 +1,71 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export MODEL_FITS_CACHE_DIR="$TMP/fit_cache"
+
+Fit the models of all locations, caching their posteriors as posterior arrays.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/cached" | grep "cached fit"
+  [1]
+
+  $ ls "$MODEL_FITS_CACHE_DIR" | sed 's/^[0-9a-f]\{64\}//' | sort | uniq -c
+        3 .posterior
+
+Rerunning on the same data should load all fits from the cache and give the
+same results.
+
+  $ cp "$TMP/cached/test_results.json" "$TMP/uncached_results.json"
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/cached" | grep "cached fit"
+  Loaded cached fit of Location A
+  Loaded cached fit of Location B
+  Loaded cached fit of Location C
+
+  $ cmp "$TMP/uncached_results.json" "$TMP/cached/test_results.json"
+
+Only locations whose sequence counts have changed are refit.
+
+  $ grep -v "Location B.*2022-01-21" ../data/seq_counts.tsv > "$TMP/changed_seq_counts.tsv"
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path "$TMP/changed_seq_counts.tsv" \
+  >   --export-path "$TMP/cached" | grep "cached fit"
+  Loaded cached fit of Location A
+  Loaded cached fit of Location C
+
+Warm started fits are keyed by their warm start. Without a warm start, fits
+start from scratch, so the first warm started run loads the cached fits.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/cached" \
+  >   --warm-start | grep "cached fit"
+  Loaded cached fit of Location A
+  Loaded cached fit of Location B
+  Loaded cached fit of Location C
+
+Fits started from the saved warm starts are not the cached fits from scratch.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/cached" \
+  >   --warm-start | grep "cached fit"
+  [1]
+
+The least recently used posteriors are removed once the cache is larger than
+MODEL_FITS_CACHE_MAX_SIZE_MB, which is checked whenever a new fit is cached.
+
+  $ MODEL_FITS_CACHE_MAX_SIZE_MB=0 python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/evicted" \
+  >   --pivot 21K > /dev/null
+
+  $ ls -A "$MODEL_FITS_CACHE_DIR"
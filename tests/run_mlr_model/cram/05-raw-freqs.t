@@ -0,0 +1,58 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export PYTHONPATH="$PWD/../../../scripts${PYTHONPATH:+:$PYTHONPATH}"
+
+The vectorized raw frequencies of the results should match the raw frequencies
+computed date by date with `np.convolve`, including dates without sequences,
+missing counts and series shorter than the 7-day window.
+
+  $ python3 - ../../../scripts/run-mlr-model.py <<'PY'
+  > import importlib.util, sys
+  > from types import SimpleNamespace
+  > import numpy as np
+  > import pandas as pd
+  > 
+  > spec = importlib.util.spec_from_file_location("run_mlr_model", sys.argv[1])
+  > run_mlr_model = importlib.util.module_from_spec(spec)
+  > spec.loader.exec_module(run_mlr_model)
+  > 
+  > def expected_raw_freq_tidy(data, location):
+  >     daily_raw_freq = data.seq_counts / data.seq_counts.sum(axis=1)[:, None]
+  >     kernel = np.ones(7)
+  >     numerator = np.apply_along_axis(lambda x: np.convolve(x, kernel, mode="same"), axis=0, arr=data.seq_counts)
+  >     denominator = np.convolve(data.seq_counts.sum(axis=1), kernel, mode="same")
+  >     weekly_raw_freq = numerator / denominator[:, None]
+  >     entries = []
+  >     for v, variant in enumerate(data.var_names):
+  >         for day, d in data.date_to_index.items():
+  >             for site, raw_freq in (("daily_raw_freq", daily_raw_freq), ("weekly_raw_freq", weekly_raw_freq)):
+  >                 entries.append({
+  >                     "location": location,
+  >                     "site": site,
+  >                     "variant": variant,
+  >                     "date": day.strftime("%Y-%m-%d"),
+  >                     "value": None if np.isnan(raw_freq[d, v]) else np.around(raw_freq[d, v], decimals=3),
+  >                 })
+  >     return entries
+  > 
+  > rng = np.random.default_rng(0)
+  > for n_dates in (3, 7, 20):
+  >     seq_counts = rng.integers(0, 20, size=(n_dates, 4)).astype(float)
+  >     seq_counts[n_dates // 2] = 0
+  >     seq_counts[-1, 1] = np.nan
+  >     dates = list(pd.date_range("2022-01-01", periods=n_dates))
+  >     data = SimpleNamespace(
+  >         seq_counts=seq_counts,
+  >         dates=dates,
+  >         var_names=["20A", "21K", "22B", "other"],
+  >         date_to_index={day: d for d, day in enumerate(dates)},
+  >     )
+  >     with np.errstate(invalid="ignore", divide="ignore"):
+  >         expected = expected_raw_freq_tidy(data, "Location A")
+  >         results = run_mlr_model.make_raw_freq_tidy(data, "Location A")
+  >     print(n_dates, len(results["data"]), results["data"] == expected, results["metadata"]["sites"])
+  > PY
+  3 24 True ['daily_raw_freq', 'weekly_raw_freq']
+  7 56 True ['daily_raw_freq', 'weekly_raw_freq']
+  20 160 True ['daily_raw_freq', 'weekly_raw_freq']
@@ -0,0 +1,56 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ sed 's/export_parquet: false/export_parquet: true/' ../data/mlr-config.yaml > "$TMP/parquet-config.yaml"
+
+Export the results of non-hierarchical and hierarchical models as both the
+results JSON and a Parquet results table, excluding the growth advantages of
+variants with fewer than 600 sequences in a location.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config "$TMP/parquet-config.yaml" \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/parquet" \
+  >   --location-ga-inclusion-threshold 600 > /dev/null
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config "$TMP/parquet-config.yaml" \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/parquet_hier" \
+  >   --location-ga-inclusion-threshold 600 \
+  >   --hier > /dev/null
+
+The results table should hold the same estimates in the same order and the
+same metadata as the results JSON.
+
+  $ cat > "$TMP/compare_results.py" <<'PY'
+  > import json, sys
+  > import pandas as pd
+  > from results_tables import read_results_metadata
+  > 
+  > results = json.load(open(sys.argv[1]))
+  > table = pd.read_parquet(sys.argv[2])
+  > 
+  > entries = [
+  >     (entry["location"], entry["site"], entry["variant"], entry.get("date"), entry.get("ps"), entry["value"])
+  >     for entry in results["data"]
+  > ]
+  > rows = [
+  >     (location, site, variant, None if pd.isna(day) else day.strftime("%Y-%m-%d"), None if pd.isna(ps) else ps, None if pd.isna(value) else value)
+  >     for location, site, variant, day, ps, value in table.itertuples(index=False)
+  > ]
+  > print(len(rows), rows == entries)
+  > print(read_results_metadata(sys.argv[2]) == results["metadata"])
+  > print(sorted({(location, variant) for location, site, variant, *_ in rows if site == "ga"}))
+  > PY
+
+  $ export PYTHONPATH="$PWD/../../../scripts${PYTHONPATH:+:$PYTHONPATH}"
+  $ python3 "$TMP/compare_results.py" "$TMP/parquet/test_results.json" "$TMP/parquet/test_results.parquet"
+  * True (glob)
+  True
+  [('Location A', '20A'), ('Location A', '21K'), ('Location B', '20A'), ('Location C', '20A'), ('Location C', '21K')]
+
+  $ python3 "$TMP/compare_results.py" "$TMP/parquet_hier/test_results.json" "$TMP/parquet_hier/test_results.parquet"
+  * True (glob)
+  True
+  [('Location A', '20A'), ('Location A', '21K'), ('Location B', '20A'), ('Location C', '20A'), ('Location C', '21K'), ('hierarchical', '20A'), ('hierarchical', '21K'), ('hierarchical', '22B')]
@@ -0,0 +1,26 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ sed 's/load: false/load: true/; s/fit: true/fit: false/' ../data/mlr-config.yaml > "$TMP/load-config.yaml"
+
+Fit the models and save their posteriors as posterior arrays.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config ../data/mlr-config.yaml \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/format" \
+  >   --posterior-format arrays > /dev/null
+  $ ls "$TMP/format/models"
+  Location A.posterior
+  Location B.posterior
+  Location C.posterior
+  $ cp "$TMP/format/test_results.json" "$TMP/fit_results.json"
+
+Loading the posterior arrays instead of fitting should export the same results.
+
+  $ python3 ../../../scripts/run-mlr-model.py \
+  >   --config "$TMP/load-config.yaml" \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/format" \
+  >   --posterior-format arrays > /dev/null
+  $ cmp "$TMP/fit_results.json" "$TMP/format/test_results.json"
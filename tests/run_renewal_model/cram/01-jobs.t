@@ -0,0 +1,44 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Fit the models of the locations one at a time and in 2 parallel processes.
+
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config ../data/renewal-config.yaml \
+  >   --case-path ../data/case_counts.tsv \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/renewal_jobs_1" > /dev/null
+
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config ../data/renewal-config.yaml \
+  >   --case-path ../data/case_counts.tsv \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/renewal_jobs_2" \
+  >   --jobs 2 > /dev/null
+
+Each location is fit from its own random state, so the fits in parallel
+processes should be identical to the fits one at a time.
+
+  $ ls "$TMP/renewal_jobs_2/models"
+  Location 0.json
+  Location 11.json
+
+  $ for model in "$TMP"/renewal_jobs_1/models/*.json; do
+  >   cmp "$model" "$TMP/renewal_jobs_2/models/$(basename "$model")"
+  > done
+  $ cmp "$TMP/renewal_jobs_1/test_results.json" "$TMP/renewal_jobs_2/test_results.json"
+
+The random state of a location only depends on its name, so fitting a single
+location should give the same fit as fitting it with the other location.
+
+  $ awk -F '\t' 'NR == 1 || $1 == "Location 11"' ../data/case_counts.tsv > "$TMP/location_11_cases.tsv"
+  $ awk -F '\t' 'NR == 1 || $1 == "Location 11"' ../data/seq_counts.tsv > "$TMP/location_11_seq.tsv"
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config ../data/renewal-config.yaml \
+  >   --case-path "$TMP/location_11_cases.tsv" \
+  >   --seq-path "$TMP/location_11_seq.tsv" \
+  >   --export-path "$TMP/location_11" > /dev/null
+
+  $ cmp "$TMP/renewal_jobs_1/models/Location 11.json" "$TMP/location_11/models/Location 11.json"
+
@@ -0,0 +1,40 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ export PYTHONPATH="$PWD/../../../scripts${PYTHONPATH:+:$PYTHONPATH}"
+  $ sed 's/export_parquet: false/export_parquet: true/' ../data/renewal-config.yaml > "$TMP/renewal-parquet-config.yaml"
+
+Export the results as both the results JSON and a Parquet results table.
+
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config "$TMP/renewal-parquet-config.yaml" \
+  >   --case-path ../data/case_counts.tsv \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/renewal_parquet" > /dev/null
+
+The results table should hold the same estimates in the same order and the
+same metadata as the results JSON.
+
+  $ python3 - "$TMP/renewal_parquet/test_results.json" "$TMP/renewal_parquet/test_results.parquet" <<'PY'
+  > import json, sys
+  > import pandas as pd
+  > from results_tables import read_results_metadata
+  > 
+  > results = json.load(open(sys.argv[1]))
+  > table = pd.read_parquet(sys.argv[2])
+  > 
+  > entries = [
+  >     (entry["location"], entry["site"], entry["variant"], entry.get("date"), entry.get("ps"), entry["value"])
+  >     for entry in results["data"]
+  > ]
+  > rows = [
+  >     (location, site, variant, None if pd.isna(day) else day.strftime("%Y-%m-%d"), None if pd.isna(ps) else ps, None if pd.isna(value) else value)
+  >     for location, site, variant, day, ps, value in table.itertuples(index=False)
+  > ]
+  > print(len(rows) > 0, rows == entries)
+  > print(read_results_metadata(sys.argv[2]) == results["metadata"])
+  > print(sorted(table["site"].unique()))
+  > PY
+  True True
+  True
+  * (glob)
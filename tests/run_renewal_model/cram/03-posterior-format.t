@@ -0,0 +1,27 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+  $ sed 's/load: false/load: true/; s/fit: true/fit: false/' ../data/renewal-config.yaml > "$TMP/renewal-load-config.yaml"
+
+Fit the models and save their posteriors as posterior arrays.
+
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config ../data/renewal-config.yaml \
+  >   --case-path ../data/case_counts.tsv \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/renewal_format" \
+  >   --posterior-format arrays > /dev/null
+  $ ls "$TMP/renewal_format/models"
+  Location 0.posterior
+  Location 11.posterior
+  $ cp "$TMP/renewal_format/test_results.json" "$TMP/renewal_fit_results.json"
+
+Loading the posterior arrays instead of fitting should export the same results.
+
+  $ python3 ../../../scripts/run-renewal-model.py \
+  >   --config "$TMP/renewal-load-config.yaml" \
+  >   --case-path ../data/case_counts.tsv \
+  >   --seq-path ../data/seq_counts.tsv \
+  >   --export-path "$TMP/renewal_format" \
+  >   --posterior-format arrays > /dev/null
+  $ cmp "$TMP/renewal_fit_results.json" "$TMP/renewal_format/test_results.json"
@@ -0,0 +1,57 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Summarize Nextstrain clades per country and Pango lineages per US division
+with the single output options, one output per run.
+The sequence with the ambiguous date "2022-11" should be dropped.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --output "$TMP/clades.tsv"
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column Nextclade_pango \
+  > --location-column division \
+  > --filter-columns country \
+  > --filter-query "country == 'USA'" \
+  > --output "$TMP/usa_lineages.tsv"
+
+  $ cat "$TMP/clades.tsv"
+  location\tclade\tdate\tsequences (esc)
+  Japan\t22E\t2022-11-28\t1 (esc)
+  Japan\t22F\t2022-11-27\t1 (esc)
+  Japan\t22F\t2022-11-28\t1 (esc)
+  USA\t22E\t2022-11-27\t2 (esc)
+  USA\t22E\t2022-11-28\t2 (esc)
+  USA\t22F\t2022-11-27\t1 (esc)
+  United Kingdom\t22E\t2022-11-27\t1 (esc)
+  United Kingdom\t22E\t2022-11-28\t1 (esc)
+  United Kingdom\t22F\t2022-11-28\t1 (esc)
+
+  $ cat "$TMP/usa_lineages.tsv"
+  location\tclade\tdate\tsequences (esc)
+  California\tBQ.1\t2022-11-28\t1 (esc)
+  California\tBQ.1.1\t2022-11-27\t2 (esc)
+  Washington\tBQ.1.1\t2022-11-28\t1 (esc)
+  Washington\tXBB.1\t2022-11-27\t1 (esc)
+
+Summarize both outputs in a single pass through the metadata with `--output-spec`.
+The outputs should be identical to the outputs of the separate runs.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --output-spec '{"output": "'"$TMP"'/spec_clades.tsv", "clade_column": "clade_nextstrain"}' \
+  > --output-spec '{"output": ["'"$TMP"'/spec_usa_lineages.tsv"], "clade_column": "Nextclade_pango", "location_column": "division", "filter_columns": ["country"], "filter_query": "country == '"'USA'"'"}'
+
+  $ diff "$TMP/clades.tsv" "$TMP/spec_clades.tsv"
+  $ diff "$TMP/usa_lineages.tsv" "$TMP/spec_usa_lineages.tsv"
+
+An output spec without a clade column is an error.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --output-spec '{"output": "'"$TMP"'/spec_clades.tsv"}' 2>&1 | tail -n 1
+  *error: argument --output-spec: Output spec * must include 'clade_column'. (glob)
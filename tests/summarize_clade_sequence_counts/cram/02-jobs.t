@@ -0,0 +1,24 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Summarize the metadata in chunks of 2 records with a single process and with
+3 processes. The counts should not depend on the number of processes.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --metadata-chunk-size 2 \
+  > --jobs 1 \
+  > --output "$TMP/clades_1_job.tsv"
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --metadata-chunk-size 2 \
+  > --jobs 3 \
+  > --output "$TMP/clades_3_jobs.tsv"
+
+  $ diff "$TMP/clades_1_job.tsv" "$TMP/clades_3_jobs.tsv"
+  $ wc -l < "$TMP/clades_3_jobs.tsv" | sed 's/^[[:space:]]*//'
+  10
@@ -0,0 +1,51 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Filter the US sequences by country, which has few distinct values, so the
+query is only evaluated once per distinct country.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --location-column division \
+  > --filter-columns country \
+  > --filter-query "country == 'USA'" \
+  > --output "$TMP/usa_clades.tsv"
+
+  $ cat "$TMP/usa_clades.tsv"
+  location\tclade\tdate\tsequences (esc)
+  California\t22E\t2022-11-27\t2 (esc)
+  California\t22E\t2022-11-28\t1 (esc)
+  Washington\t22E\t2022-11-28\t1 (esc)
+  Washington\t22F\t2022-11-27\t1 (esc)
+
+Filter by the strain as well, which is distinct for every sequence, so the
+query is evaluated against all rows instead.
+This should only drop the sequence USA/CA-1/2022.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --location-column division \
+  > --filter-columns country strain \
+  > --filter-query "country == 'USA' & strain != 'USA/CA-1/2022'" \
+  > --output "$TMP/usa_clades_without_strain.tsv"
+
+  $ cat "$TMP/usa_clades_without_strain.tsv"
+  location\tclade\tdate\tsequences (esc)
+  California\t22E\t2022-11-27\t1 (esc)
+  California\t22E\t2022-11-28\t1 (esc)
+  Washington\t22E\t2022-11-28\t1 (esc)
+  Washington\t22F\t2022-11-27\t1 (esc)
+
+Filter queries that use columns that are not filter columns are an error.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --filter-columns country \
+  > --filter-query "division == 'California'" \
+  > --output "$TMP/california_clades.tsv"
+  ERROR: An error occurred when applying the filter query. Most likely the filter query used columns that were not included in the filter columns. See detailed error: (name 'division' is not defined)
+  [1]
@@ -0,0 +1,28 @@
+Setup
+
+  $ pushd "$TESTDIR" > /dev/null
+
+Write the same counts as a TSV file and as a Parquet file.
+
+  $ python3 ../../../ingest/bin/summarize-clade-sequence-counts \
+  > --metadata ../data/metadata.tsv \
+  > --clade-column clade_nextstrain \
+  > --output "$TMP/clades.tsv" "$TMP/clades.parquet"
+
+The Parquet file should have typed columns.
+
+  $ python3 -c '
+  > import sys, pyarrow.parquet as pq
+  > print(*(f"{field.name}:{field.type}" for field in pq.read_schema(sys.argv[1])))
+  > ' "$TMP/clades.parquet"
+  location:dictionary<values=string, indices=int32, ordered=0> clade:dictionary<values=string, indices=int32, ordered=0> date:date32[day] sequences:int32
+
+Reading the Parquet file back should give the same rows as the TSV file.
+
+  $ python3 -c '
+  > import sys; sys.path.insert(0, "../../../scripts")
+  > from count_tables import read_counts
+  > read_counts(sys.argv[1]).to_csv(sys.argv[2], sep="\t", index=False)
+  > ' "$TMP/clades.parquet" "$TMP/clades.parquet.tsv"
+
+  $ diff "$TMP/clades.tsv" "$TMP/clades.parquet.tsv"
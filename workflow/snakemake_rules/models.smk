@@ -3,12 +3,34 @@ This part of the workflow runs the model scripts.
 """
 
 import json
+import yaml
+
+# Locations of non-hierarchical models are fit in parallel processes with the
+# `--jobs` option of the model scripts. Each process loads its own copy of JAX
+# and the data, so the memory of a model job scales with its number of jobs.
+MODEL_JOBS = int(config.get("model_jobs", 4))
+MODEL_MEM_MB_PER_JOB = 4000
+
+def _mlr_is_hierarchical():
+    """
+    Return whether the MLR config fits a single hierarchical model, which
+    cannot be split into parallel jobs.
+    """
+    if not config.get("mlr_config"):
+        return False
+
+    with open(config["mlr_config"], "r", encoding="utf-8") as fh:
+        mlr_config = yaml.safe_load(fh)
+
+    return bool(mlr_config.get("model", {}).get("hierarchical", False))
+
+MLR_MODEL_JOBS = 1 if _mlr_is_hierarchical() else MODEL_JOBS
 
 def _get_sequence_counts_input(wildcards):
     if wildcards.variant_classification == 'pango_lineages':
-        return "data/{data_provenance}/{variant_classification}/{geo_resolution}/collapsed_seq_counts.tsv"
+        return "data/{data_provenance}/{variant_classification}/{geo_resolution}/collapsed_seq_counts." + COUNTS_EXTENSION
 
-    return "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts.tsv"
+    return "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts." + COUNTS_EXTENSION
 
 def _get_models_option(wildcards, option_name):
     """
@@ -33,7 +55,7 @@ def _get_models_option(wildcards, option_name):
 
 rule renewal_model:
     input:
-        cases = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases.tsv",
+        cases = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases." + COUNTS_EXTENSION,
         sequence_counts = _get_sequence_counts_input
     output:
         # Note this output is not used in the shell command because it is one of the many
@@ -47,9 +69,12 @@ rule renewal_model:
         "benchmarks/{data_provenance}/{variant_classification}/{geo_resolution}/renewal/{date}.txt"
     params:
         renewal_config = config.get("renewal_config"),
-        export_path = lambda w: f"results/{w.data_provenance}/{w.variant_classification}/{w.geo_resolution}/renewal"
+        export_path = lambda w: f"results/{w.data_provenance}/{w.variant_classification}/{w.geo_resolution}/renewal",
+        posterior_format = config.get("posterior_format", "json")
+    # Locations are fit in parallel processes
+    threads: MODEL_JOBS
     resources:
-        mem_mb=4000
+        mem_mb=lambda wildcards, threads: MODEL_MEM_MB_PER_JOB * threads
     shell:
         """
         python -u ./scripts/run-renewal-model.py \
@@ -57,6 +82,8 @@ rule renewal_model:
             --case-path {input.cases} \
             --seq-path {input.sequence_counts} \
             --export-path {params.export_path} \
+            --posterior-format {params.posterior_format} \
+            --jobs {threads} \
             --data-name {wildcards.date} 2>&1 | tee {log}
         """
 
@@ -78,9 +105,13 @@ rule mlr_model:
         renewal_config = config.get("mlr_config"),
         export_path = lambda w: f"results/{w.data_provenance}/{w.variant_classification}/{w.geo_resolution}/mlr/model-outputs",
         pivot = lambda wildcards: _get_models_option(wildcards, 'pivot'),
-        location_ga_inclusion_threshold = lambda wildcards: _get_models_option(wildcards, 'location_ga_inclusion_threshold')
+        location_ga_inclusion_threshold = lambda wildcards: _get_models_option(wildcards, 'location_ga_inclusion_threshold'),
+        warm_start = "--warm-start" if config.get("warm_start_models") else "",
+        posterior_format = config.get("posterior_format", "json")
+    # Locations of non-hierarchical models are fit in parallel processes
+    threads: MLR_MODEL_JOBS
     resources:
-        mem_mb=4000
+        mem_mb=lambda wildcards, threads: MODEL_MEM_MB_PER_JOB * threads
     shell:
         """
         python -u ./scripts/run-mlr-model.py \
@@ -89,6 +120,9 @@ rule mlr_model:
             --export-path {params.export_path} \
             {params.pivot} \
             {params.location_ga_inclusion_threshold} \
+            {params.warm_start} \
+            --posterior-format {params.posterior_format} \
+            --jobs {threads} \
             --data-name {wildcards.date} 2>&1 | tee {log}
         """
 
@@ -96,15 +130,22 @@ rule post_process:
     """
     Potentially modifies/adds colours, display names, variant ordering
     """
-    input: "results/{data_provenance}/{variant_classification}/{geo_resolution}/{model}/model-outputs/{date}_results.json"
+    input:
+        results = "results/{data_provenance}/{variant_classification}/{geo_resolution}/{model}/model-outputs/{date}_results.json",
+        # Only Pango lineages need the alias key to order and colour lineages
+        pango_alias = lambda wildcards: PANGO_ALIAS_KEY if wildcards.variant_classification == "pango_lineages" else [],
     output: "results/{data_provenance}/{variant_classification}/{geo_resolution}/{model}/{date}_results.json"
-    params: json.dumps(config.get("clade_definitions"))
+    params:
+        clade_definitions = json.dumps(config.get("clade_definitions")),
+        pango_alias = lambda wildcards, input: f"--pango-alias {input.pango_alias} --pango-alias-cache {PANGO_ALIAS_CACHE}" if input.pango_alias else "",
     log: "logs/{data_provenance}/{variant_classification}/{geo_resolution}/{model}/{date}_post-processing.txt"
     shell:
         """
         python ./scripts/modify-lineage-colours-and-order.py \
-            --input {input} \
+            --input {input.results} \
             --output {output} \
-            --config {params:q} \
-            --variant-classification {wildcards.variant_classification} 2>&1 | tee {log}
+            --config {params.clade_definitions:q} \
+            {params.pango_alias} \
+            --variant-classification {wildcards.variant_classification} \
+            --metadata-only 2>&1 | tee {log}
         """
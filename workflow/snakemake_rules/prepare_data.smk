@@ -1,6 +1,10 @@
 """
 This part of the workflow downloads and prepares the data necessary to run models
 """
+import json
+import shlex
+
+from types import SimpleNamespace
 
 rule download_case_counts:
     output:
@@ -12,16 +16,41 @@ rule download_case_counts:
         curl -fsSL --compressed {params.cases_url:q} --output {output.cases}
         """
 
+# Variant counts are published by ingest as both compressed TSVs and Parquet files
+VARIANT_COUNTS_EXTENSION = "parquet" if COUNTS_EXTENSION == "parquet" else "tsv.gz"
+
 rule download_variant_counts:
     output:
-        clades = "data/{data_provenance}/{variant_classification}/{geo_resolution}.tsv.gz"
+        clades = "data/{data_provenance}/{variant_classification}/{geo_resolution}." + VARIANT_COUNTS_EXTENSION
     params:
-        clades_url = "https://data.nextstrain.org/files/workflows/forecasts-ncov/{data_provenance}/{variant_classification}/{geo_resolution}.tsv.gz"
+        clades_url = "https://data.nextstrain.org/files/workflows/forecasts-ncov/{data_provenance}/{variant_classification}/{geo_resolution}." + VARIANT_COUNTS_EXTENSION
     shell:
         """
         curl -fsSL --compressed {params.clades_url:q} --output {output.clades}
         """
 
+# Use a local copy of the Pango alias key if provided, so the lineage scripts
+# can run without downloading it. Otherwise, download it to the data directory,
+# where it is kept between runs. Remove it or rerun download_pango_alias_key
+# (e.g. with `--forcerun download_pango_alias_key`) to use the latest alias key.
+PANGO_ALIAS_KEY = config.get("pango_alias_key") or "data/pango_alias_key.json"
+
+# Resolved Pango lineages are cached between runs in a single cache that is
+# shared by all lineage jobs. The cache stores the hash of the alias key it was
+# resolved with, so it is only reused with the same alias key. Jobs replace
+# the cache atomically after merging it with their resolved lineages.
+PANGO_ALIAS_CACHE = "data/pango_alias_cache.json"
+
+rule download_pango_alias_key:
+    output:
+        alias_key = "data/pango_alias_key.json"
+    params:
+        alias_key_url = config.get("pango_alias_key_url", "https://raw.githubusercontent.com/cov-lineages/pango-designation/master/pango_designation/alias_key.json")
+    shell:
+        """
+        curl -fsSL --compressed {params.alias_key_url:q} --output {output.alias_key}
+        """
+
 def _get_prepare_data_option(wildcards, option_name):
     """
     Return the option for prepare data from the config based on the
@@ -67,15 +96,65 @@ def _get_config_files_for_prepare_data(wildcards):
 
     return config_files
 
+def _get_prepare_data_combinations():
+    """
+    Return (data_provenance, variant_classification, geo_resolution) tuples
+    for all combinations in the config.
+    """
+    data_provenances = config["data_provenances"] if isinstance(config["data_provenances"], list) else [config["data_provenances"]]
+    variant_classifications = config["variant_classifications"] if isinstance(config["variant_classifications"], list) else [config["variant_classifications"]]
+    geo_resolutions = config["geo_resolutions"] if isinstance(config["geo_resolutions"], list) else [config["geo_resolutions"]]
+
+    return [
+        (data_provenance, variant_classification, geo_resolution)
+        for data_provenance in data_provenances
+        for variant_classification in variant_classifications
+        for geo_resolution in geo_resolutions
+    ]
+
+# Options in config['prepare_data'] that are only used by rules other than
+# the prepare data rules
+NON_TARGET_PREPARE_DATA_OPTIONS = {"collapse_threshold"}
+
+def _get_prepare_data_targets(wildcards):
+    """
+    Return the `--target` options for preparing the data of all combinations
+    in the config in a single process. All options of the combinations except
+    the NON_TARGET_PREPARE_DATA_OPTIONS are passed to the prepare data
+    script, which rejects unknown options instead of silently ignoring them.
+    """
+    targets = []
+    for data_provenance, variant_classification, geo_resolution in _get_prepare_data_combinations():
+        options = config.get('prepare_data', {}) \
+                        .get(data_provenance, {}) \
+                        .get(variant_classification, {}) \
+                        .get(geo_resolution, {})
+
+        target = {
+            "seq_counts": f"data/{data_provenance}/{variant_classification}/{geo_resolution}.{VARIANT_COUNTS_EXTENSION}",
+            "cases": f"data/cases/{geo_resolution}.tsv.gz",
+            "output_seq_counts": f"data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts.{COUNTS_EXTENSION}",
+            "output_cases": f"data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases.{COUNTS_EXTENSION}",
+            **{
+                option_name: option_value
+                for option_name, option_value in options.items()
+                if option_name not in NON_TARGET_PREPARE_DATA_OPTIONS and option_value is not None
+            },
+        }
+        # Dates from YAML are converted to 'YYYY-MM-DD' strings
+        targets.append(f"--target {shlex.quote(json.dumps(target, default=str))}")
+
+    return " ".join(targets)
+
 rule prepare_clade_data:
     """Preparing clade counts for analysis"""
     input:
         cases = "data/cases/{geo_resolution}.tsv.gz",
-        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}.tsv.gz",
+        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}." + VARIANT_COUNTS_EXTENSION,
         config_files = _get_config_files_for_prepare_data,
     output:
-        cases = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases.tsv",
-        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts.tsv"
+        cases = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases." + COUNTS_EXTENSION,
+        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts." + COUNTS_EXTENSION
     log:
         "logs/{data_provenance}/{variant_classification}/{geo_resolution}/prepare_data.txt"
     params:
@@ -106,20 +185,67 @@ rule prepare_clade_data:
             --output-cases {output.cases} 2>&1 | tee {log}
         """
 
+if config.get("prepare_data_batch"):
+    rule prepare_all_clade_data:
+        """Preparing clade counts for analysis of all combinations in a single process"""
+        input:
+            cases = sorted({
+                f"data/cases/{geo_resolution}.tsv.gz"
+                for _, _, geo_resolution in _get_prepare_data_combinations()
+            }),
+            sequence_counts = [
+                f"data/{data_provenance}/{variant_classification}/{geo_resolution}.{VARIANT_COUNTS_EXTENSION}"
+                for data_provenance, variant_classification, geo_resolution in _get_prepare_data_combinations()
+            ],
+            config_files = lambda wildcards: [
+                config_file
+                for data_provenance, variant_classification, geo_resolution in _get_prepare_data_combinations()
+                for config_file in _get_config_files_for_prepare_data(SimpleNamespace(
+                    data_provenance=data_provenance,
+                    variant_classification=variant_classification,
+                    geo_resolution=geo_resolution,
+                ))
+            ],
+        output:
+            cases = [
+                f"data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_cases.{COUNTS_EXTENSION}"
+                for data_provenance, variant_classification, geo_resolution in _get_prepare_data_combinations()
+            ],
+            sequence_counts = [
+                f"data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts.{COUNTS_EXTENSION}"
+                for data_provenance, variant_classification, geo_resolution in _get_prepare_data_combinations()
+            ],
+        log:
+            "logs/prepare_data.txt"
+        params:
+            targets = _get_prepare_data_targets,
+        shell:
+            """
+            python ./scripts/prepare-data.py \
+                {params.targets} 2>&1 | tee {log}
+            """
+
+    # Prefer the batch rule over preparing each combination separately
+    ruleorder: prepare_all_clade_data > prepare_clade_data
+
 rule collapse_sequence_counts:
     "Collapsing Pango lineages, based on sequence count threshold"
     input:
-        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts.tsv",
+        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/prepared_seq_counts." + COUNTS_EXTENSION,
+        pango_alias = PANGO_ALIAS_KEY,
     output:
-        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/collapsed_seq_counts.tsv"
+        sequence_counts = "data/{data_provenance}/{variant_classification}/{geo_resolution}/collapsed_seq_counts." + COUNTS_EXTENSION
     log:
         "logs/{data_provenance}/{variant_classification}/{geo_resolution}/collapse_sequence_counts.txt"
     params:
         collapse_threshold = lambda wildcards: _get_prepare_data_option(wildcards, 'collapse_threshold'),
+        pango_alias_cache = PANGO_ALIAS_CACHE,
     shell:
         """
         python ./scripts/collapse-lineage-counts.py \
             --seq-counts {input.sequence_counts} \
             {params.collapse_threshold} \
+            --pango-alias {input.pango_alias} \
+            --pango-alias-cache {params.pango_alias_cache} \
             --output-seq-counts {output.sequence_counts} 2>&1 | tee {log}
         """
@@ -29,11 +29,15 @@ def _get_model_json_for_model_abbr(wildcards):
         **model_parameters,
     )
 
-def _get_posterior_json_for_model_abbr(wildcards):
+def _get_posterior_for_model_abbr(wildcards):
     model_parameters = config["hub_models"][wildcards.model_abbr]
 
-    return "results/{data_provenance}/{variant_classification}/{geo_resolution}/mlr/model-outputs/models/hierarchical.json".format(
+    # Posteriors are saved as JSON or as a directory of posterior arrays
+    extension = ".posterior" if config.get("posterior_format", "json") == "arrays" else ".json"
+
+    return "results/{data_provenance}/{variant_classification}/{geo_resolution}/mlr/model-outputs/models/hierarchical{extension}".format(
         **model_parameters,
+        extension=extension,
     )
 
 rule prepare_hub_submission:
@@ -48,7 +52,7 @@ rule prepare_hub_submission:
         # run-model script, so we can refer to it here as an explicit input
         # instead of a parameter. For now, we expect that this posterior file
         # exists when the main model JSON exists.
-        posterior=_get_posterior_json_for_model_abbr,
+        posterior=_get_posterior_for_model_abbr,
     shell:
         r"""
         python scripts/prepare_hub_submission.py \